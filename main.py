@@ -4,17 +4,23 @@ import threading
 import sys
 import os
 import io
+import queue
 
 # Import logic
 import youtube_subtitle_trans
 from utils import subtitle_formatter
 
+# How often queued log lines are flushed into the log area (ms)
+LOG_DRAIN_INTERVAL_MS = 100
+
 class App:
     def __init__(self, root):
         self.root = root
         self.root.title("YouTube Subtitle Generator & Merger")
         self.root.geometry("750x650")
 
+        self.log_queue = queue.Queue()
+
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(expand=True, fill='both', padx=10, pady=10)
 
@@ -24,6 +30,8 @@ class App:
         
         self.check_ffmpeg()
 
+        self.root.after(LOG_DRAIN_INTERVAL_MS, self._drain_log)
+
     def check_ffmpeg(self):
         import shutil
         if not shutil.which("ffmpeg"):
@@ -31,10 +39,21 @@ class App:
             self.log("Please install ffmpeg and add it to your system PATH.")
 
     def log(self, message):
-        def _log():
-            self.log_area.insert(tk.END, message + "\n")
+        # Thread-safe: messages are queued and flushed by _drain_log on the Tk thread
+        self.log_queue.put(message)
+
+    def _drain_log(self):
+        messages = []
+        try:
+            while True:
+                messages.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if messages:
+            # One insert per tick instead of one Tcl round-trip per line
+            self.log_area.insert(tk.END, "\n".join(messages) + "\n")
             self.log_area.see(tk.END)
-        self.root.after(0, _log)
+        self.root.after(LOG_DRAIN_INTERVAL_MS, self._drain_log)
 
     def init_trans_tab(self):
         tab = ttk.Frame(self.notebook)
@@ -74,7 +93,8 @@ class App:
         engine_frame = ttk.Frame(tab)
         engine_frame.pack(pady=2)
         ttk.Label(engine_frame, text="Engine:").pack(side='left', padx=5)
-        self.engine_combo = ttk.Combobox(engine_frame, values=["Whisper", "Google"], width=10, state='readonly')
+        self.engine_options = {"Whisper": "whisper", "FasterWhisper": "faster-whisper", "Google": "google"}
+        self.engine_combo = ttk.Combobox(engine_frame, values=list(self.engine_options.keys()), width=14, state='readonly')
         self.engine_combo.set("Whisper")
         self.engine_combo.pack(side='left', padx=5)
 
@@ -175,7 +195,7 @@ class App:
         whisper_prompt = self.whisper_prompt_entry.get().strip() or None
         chunk_size_name = self.chunk_size_combo.get()
         max_segment_sec = self.chunk_size_options.get(chunk_size_name)
-        engine = self.engine_combo.get().lower()
+        engine = self.engine_options.get(self.engine_combo.get(), "whisper")
         
         if not url:
             self.log("Please enter a URL.")
@@ -2,7 +2,9 @@ import unittest
 from unittest.mock import MagicMock
 from utils import translator, subtitle_formatter
 import json
+import io
 import os
+import tempfile
 
 class TestCore(unittest.TestCase):
     def test_format_timestamp(self):
@@ -11,22 +13,59 @@ class TestCore(unittest.TestCase):
         formatted = subtitle_formatter.format_timestamp(seconds)
         self.assertEqual(formatted, "01:01:01,500")
 
+    def test_format_timestamp_rounding(self):
+        # Float error must not truncate to the previous millisecond
+        self.assertEqual(subtitle_formatter.format_timestamp(0.29), "00:00:00,290")
+        # Rounding up carries into seconds/minutes
+        self.assertEqual(subtitle_formatter.format_timestamp(59.9996), "00:01:00,000")
+
     def test_generate_srt(self):
         segments = [
             {'start': 0, 'end': 2, 'text': "Hello"},
             {'start': 2.5, 'end': 4, 'text': "World"}
         ]
-        output_path = "test_output.srt"
-        subtitle_formatter.generate_srt(segments, output_path)
-        
-        with open(output_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        out = io.StringIO()
+        subtitle_formatter._generate_srt_stream(segments, out)
             
         expected = "1\n00:00:00,000 --> 00:00:02,000\nHello\n\n2\n00:00:02,500 --> 00:00:04,000\nWorld\n\n"
-        # Normalize newlines
-        self.assertEqual(content.replace('\r\n', '\n'), expected)
-        
-        os.remove(output_path)
+        self.assertEqual(out.getvalue(), expected)
+
+    def test_generate_bilingual_srt_uneven(self):
+        original = [
+            {'start': 0, 'end': 2, 'text': "Hello "},
+            {'start': 2.5, 'end': 4, 'text': "World"}
+        ]
+        translated = [
+            {'start': 0, 'end': 2, 'text': "你好"}
+        ]
+        out = io.StringIO()
+        subtitle_formatter._generate_bilingual_srt_stream(original, translated, out)
+
+        expected = "1\n00:00:00,000 --> 00:00:02,000\n你好\nHello\n\n2\n00:00:02,500 --> 00:00:04,000\nWorld\n\n"
+        self.assertEqual(out.getvalue(), expected)
+
+    def test_render_srt_bytes(self):
+        original = [{'start': 0, 'end': 2, 'text': "Hello"}, {'start': 2.5, 'end': 4, 'text': "World"}]
+        translated = [{'start': 0, 'end': 2, 'text': "你好"}]
+        out = io.StringIO()
+        subtitle_formatter._generate_srt_stream(original, out)
+        self.assertEqual(subtitle_formatter.render_srt_bytes(original), out.getvalue().encode('utf-8'))
+        out = io.StringIO()
+        subtitle_formatter._generate_bilingual_srt_stream(original, translated, out)
+        self.assertEqual(subtitle_formatter.render_bilingual_bytes(original, translated), out.getvalue().encode('utf-8'))
+
+    def test_srt_file_roundtrip(self):
+        segments = [
+            {'start': 0, 'end': 2, 'text': "Hello"},
+            {'start': 2.5, 'end': 4, 'text': "World"}
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, "test_output.srt")
+            subtitle_formatter.generate_srt(segments, output_path)
+            parsed = subtitle_formatter.parse_srt(output_path)
+
+        self.assertEqual([(s['start'], s['end'], s['text']) for s in parsed],
+                         [(0.0, 2.0, "Hello"), (2.5, 4.0, "World")])
 
     def test_translator_mock(self):
         mock_client = MagicMock()
@@ -55,6 +94,51 @@ class TestCore(unittest.TestCase):
         self.assertEqual(result[0]['text'], "你好")
         self.assertEqual(result[1]['text'], "世界")
 
+    def test_translate_segments_keeps_batch_order(self):
+        mock_client = MagicMock()
+
+        # Echo each batch back upper-cased, so every batch gets its own answer
+        def side_effect(*args, **kwargs):
+            batch = json.loads(kwargs['messages'][1]['content'].rsplit('\n', 1)[1])
+            content = json.dumps({"segments": [dict(seg, text=seg['text'].upper()) for seg in batch]})
+            return MagicMock(choices=[MagicMock(message=MagicMock(content=content))])
+
+        mock_client.chat.completions.create.side_effect = side_effect
+
+        segments = [{'start': i, 'end': i + 1, 'text': f"line {i}"} for i in range(10)]
+        result = translator.translate_segments(mock_client, segments, "English", batch_size=3)
+
+        self.assertEqual([s['text'] for s in result], [f"LINE {i}" for i in range(10)])
+        self.assertEqual([s['start'] for s in result], list(range(10)))
+
+    def test_translate_segments_batch_api(self):
+        mock_client = MagicMock()
+        segments = [{'start': i, 'end': i + 1, 'text': f"line {i}"} for i in range(translator.BATCH_API_MIN_SEGMENTS)]
+
+        # Job finishes immediately; batch_1 is missing from the output and goes through the sync path
+        mock_client.batches.create.return_value = MagicMock(id="job", status="completed", output_file_id="out")
+        output_lines = []
+        for idx in (0, 2, 3):
+            batch = segments[idx * 15:(idx + 1) * 15]
+            content = json.dumps({"segments": [{"id": j, "text": s['text'].upper()} for j, s in enumerate(batch)]})
+            output_lines.append(json.dumps({
+                "custom_id": f"batch_{idx}",
+                "response": {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}
+            }))
+        mock_client.files.content.return_value = MagicMock(text="\n".join(output_lines))
+
+        def sync_side_effect(*args, **kwargs):
+            batch = json.loads(kwargs['messages'][1]['content'].rsplit('\n', 1)[1])
+            content = json.dumps({"segments": [dict(seg, text=seg['text'].upper()) for seg in batch]})
+            return MagicMock(choices=[MagicMock(message=MagicMock(content=content))])
+
+        mock_client.chat.completions.create.side_effect = sync_side_effect
+
+        result = translator.translate_segments_batch_api(mock_client, segments, "English", poll_interval=0)
+
+        self.assertEqual([s['text'] for s in result], [s['text'].upper() for s in segments])
+        self.assertEqual(mock_client.chat.completions.create.call_count, 1)
+
     def test_parse_vtt(self):
         vtt_content = """WEBVTT
 
@@ -65,10 +149,7 @@ Line 2
 00:00:02.500 --> 00:00:04.000 align:start position:0%
 Line 3
 """
-        with open("test.vtt", "w", encoding="utf-8") as f:
-            f.write(vtt_content)
-            
-        segments = subtitle_formatter.parse_vtt("test.vtt")
+        segments = subtitle_formatter._parse_vtt_stream(io.StringIO(vtt_content))
         
         self.assertEqual(len(segments), 2)
         self.assertEqual(segments[0]['start'], 0.0)
@@ -77,8 +158,6 @@ Line 3
         self.assertEqual(segments[1]['start'], 2.5)
         self.assertEqual(segments[1]['end'], 4.0)
         self.assertEqual(segments[1]['text'], "Line 3")
-        
-        os.remove("test.vtt")
 
     def test_parse_srt(self):
         srt_content = """1
@@ -89,17 +168,12 @@ Line 1
 00:00:02,500 --> 00:00:04,000
 Line 2
 """
-        with open("test.srt", "w", encoding="utf-8") as f:
-            f.write(srt_content)
-            
-        segments = subtitle_formatter.parse_srt("test.srt")
+        segments = subtitle_formatter._parse_srt_stream(io.StringIO(srt_content))
         
         self.assertEqual(len(segments), 2)
         self.assertEqual(segments[0]['start'], 0.0)
         self.assertEqual(segments[0]['end'], 2.0)
         self.assertEqual(segments[0]['text'], "Line 1")
-        
-        os.remove("test.srt")
 
 if __name__ == '__main__':
     unittest.main()
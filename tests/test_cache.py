@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import cache
+
+class TestTranscriptionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        patcher = patch.object(cache, 'CACHE_DIR', os.path.join(self.tmp_dir.name, 'cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.audio_path = os.path.join(self.tmp_dir.name, 'audio.mp3')
+        with open(self.audio_path, 'wb') as f:
+            f.write(b'fake audio bytes')
+
+    def test_put_then_get(self):
+        key = cache.make_key(self.audio_path, engine='whisper', source_lang='en')
+        self.assertIsNone(cache.get(key))
+
+        segments = [{'start': 0.0, 'end': 1.5, 'text': 'สวัสดี'}]
+        cache.put(key, segments)
+        self.assertEqual(cache.get(key), segments)
+
+    def test_key_depends_on_settings_and_content(self):
+        key = cache.make_key(self.audio_path, engine='whisper', source_lang='en')
+        self.assertEqual(key, cache.make_key(self.audio_path, source_lang='en', engine='whisper'))
+        self.assertNotEqual(key, cache.make_key(self.audio_path, engine='google', source_lang='en'))
+
+        with open(self.audio_path, 'ab') as f:
+            f.write(b' more')
+        self.assertNotEqual(key, cache.make_key(self.audio_path, engine='whisper', source_lang='en'))
+
+if __name__ == '__main__':
+    unittest.main()
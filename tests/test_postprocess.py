@@ -0,0 +1,103 @@
+import unittest
+from unittest.mock import patch
+from types import SimpleNamespace
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import transcriber
+
+class TestTranscriptPostprocess(unittest.TestCase):
+    def test_filter_hallucinations(self):
+        segments = [
+            {'start': 0, 'end': 1, 'text': 'Hello'},
+            {'start': 1, 'end': 2, 'text': 'Hello'},  # consecutive duplicate
+            {'start': 2, 'end': 3, 'text': ''},  # empty (texts arrive stripped)
+            {'start': 3, 'end': 4, 'text': 'noise', 'no_speech_prob': 0.95},
+            SimpleNamespace(start=4, end=5, text='World', no_speech_prob=0.1),
+        ]
+        filtered = transcriber._filter_hallucinations(segments)
+        self.assertEqual([s['text'] if isinstance(s, dict) else s.text for s in filtered], ['Hello', 'World'])
+
+    def test_filter_repeated_text(self):
+        segments = [{'start': i, 'end': i + 1, 'text': 'Thanks for watching' if i % 2 else f'line {i}'}
+                    for i in range(20)]
+        filtered = transcriber._filter_hallucinations(segments)
+        self.assertEqual([s['text'] for s in filtered], [f'line {i}' for i in range(0, 20, 2)])
+
+    def test_deduplicate_segments(self):
+        segments = [
+            {'start': 10.0, 'end': 12.0, 'text': 'second'},
+            {'start': 0.0, 'end': 2.0, 'text': 'first'},
+            {'start': 0.5, 'end': 2.0, 'text': 'first, longer'},
+            {'start': 10.4, 'end': 12.0, 'text': 'sec'},
+        ]
+        deduped = transcriber._deduplicate_segments(segments)
+        self.assertEqual([s['text'] for s in deduped], ['first, longer', 'second'])
+
+    def test_deduplicate_evenly_spaced_segments(self):
+        # Starts 0.8s apart: each is compared with the kept segment, not the
+        # previous start, so the run doesn't collapse into one segment
+        segments = [{'start': i * 0.8, 'end': i * 0.8 + 0.8, 'text': f'word{i}'} for i in range(10)]
+        deduped = transcriber._deduplicate_segments(segments)
+        self.assertEqual([s['text'] for s in deduped], ['word0', 'word2', 'word4', 'word6', 'word8'])
+
+    def test_deduplicate_runs_of_three_or_more(self):
+        # Three overlapping-chunk copies of one line: the longest wins, and a
+        # later start within threshold of the replaced winner joins its cluster
+        segments = [
+            {'start': 5.0, 'end': 7.0, 'text': 'hel'},
+            {'start': 5.3, 'end': 7.0, 'text': 'hello there'},
+            {'start': 5.6, 'end': 7.0, 'text': 'hello'},
+            {'start': 6.2, 'end': 7.0, 'text': 'there, and more'},  # 0.9s after the winner
+            {'start': 7.5, 'end': 8.0, 'text': 'next'},
+        ]
+        deduped = transcriber._deduplicate_segments(segments)
+        self.assertEqual([s['text'] for s in deduped], ['there, and more', 'next'])
+
+        result, deduped_count = transcriber._postprocess_segments(segments)
+        self.assertEqual(deduped_count, 2)
+
+    def test_postprocess_segments(self):
+        segments = [
+            {'start': 0.0, 'end': 2.0, 'text': 'first'},
+            {'start': 0.5, 'end': 2.0, 'text': 'first, longer'},
+            {'start': 3.0, 'end': 4.0, 'text': 'first, longer'},  # consecutive duplicate after dedup
+            {'start': 5.0, 'end': 6.0, 'text': 'last'},
+        ]
+        result, deduped_count = transcriber._postprocess_segments(segments)
+        self.assertEqual(deduped_count, 3)
+        self.assertEqual([s['text'] for s in result], ['first, longer', 'last'])
+
+        result, deduped_count = transcriber._postprocess_segments(segments, deduplicate=False)
+        self.assertEqual(deduped_count, 4)
+        self.assertEqual([s['text'] for s in result], ['first', 'first, longer', 'last'])
+
+class TestSegmentTranscription(unittest.TestCase):
+    def test_rejected_copy_is_retried_reencoded(self):
+        class RejectedError(Exception):
+            status_code = 400
+
+        def fake_transcribe(client, audio, *args):
+            if audio.name.endswith('.m4a'):
+                raise RejectedError("Invalid file format. Supported formats: ['flac', 'm4a', 'mp3', ...]")
+            return [{'start': 0.0, 'end': 1.0, 'text': 'hello'}]
+
+        reextract_calls = []
+        def reextract():
+            reextract_calls.append(True)
+            return b'mp3 bytes', 'mp3'
+
+        with patch.object(transcriber, '_transcribe_file', fake_transcribe):
+            index, segments = transcriber._transcribe_single_segment(
+                None, (b'm4a bytes', 'm4a'), 3, 10000, 11000, reextract=reextract)
+            self.assertEqual((index, segments), (3, [{'start': 10.0, 'end': 11.0, 'text': 'hello'}]))
+            self.assertEqual(len(reextract_calls), 1)
+
+            # Without a fallback (or for other errors) the segment is reported as failed
+            self.assertEqual(transcriber._transcribe_single_segment(None, (b'm4a bytes', 'm4a'), 3, 10000, 11000), (3, None))
+
+if __name__ == '__main__':
+    unittest.main()
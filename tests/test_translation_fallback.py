@@ -68,5 +68,21 @@ class TestTranslationFallback(unittest.TestCase):
         
         print("Test passed!")
 
+    def test_retry_delay(self):
+        # Exponential backoff with bounded jitter
+        for attempt in (1, 2, 3):
+            delay = translator._retry_delay(attempt)
+            base = translator.RETRY_BASE_DELAY_SEC * 2 ** attempt
+            self.assertGreaterEqual(delay, base)
+            self.assertLessEqual(delay, base + translator.RETRY_JITTER_SEC)
+        self.assertLessEqual(translator._retry_delay(20), translator.RETRY_MAX_DELAY_SEC + translator.RETRY_JITTER_SEC)
+
+        # Retry-After from a rate-limit error wins over the backoff
+        rate_limit_error = Exception("429")
+        rate_limit_error.response = MagicMock(headers={'retry-after': '7'})
+        delay = translator._retry_delay(1, rate_limit_error)
+        self.assertGreaterEqual(delay, 7)
+        self.assertLessEqual(delay, 7 + translator.RETRY_JITTER_SEC)
+
 if __name__ == '__main__':
     unittest.main()
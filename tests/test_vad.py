@@ -0,0 +1,170 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import transcriber, vad, vad_kernel
+
+class TestVad(unittest.TestCase):
+    def _frames(self, levels):
+        # One FRAME_MS frame per level: a full-scale-relative sine at that amplitude
+        hop = vad.SAMPLE_RATE * vad.FRAME_MS // 1000
+        t = np.arange(hop) / vad.SAMPLE_RATE
+        tone = np.sin(2 * np.pi * 440 * t)
+        return np.stack([(tone * level * 32767).astype(np.int16) for level in levels])
+
+    def test_classify_frames(self):
+        # -60 dBFS is silent at a -40 threshold, -10 dBFS is not
+        frames = self._frames([0.001, 0.3, 0.0, 0.01])
+        hop = frames.shape[1]
+        q = vad_kernel.silence_q(-40)
+        pcm = np.concatenate([frames.ravel(), frames[0, :hop // 2]])  # trailing partial frame is ignored
+        expected = [True, False, True, True]
+        self.assertEqual(vad_kernel.classify_frames(pcm, hop, q).tolist(), expected)
+        # Early-exit loop and vectorized version agree
+        self.assertEqual(vad_kernel._classify_frames_loop(pcm, hop, q).tolist(), expected)
+        self.assertEqual(vad_kernel._classify_frames_numpy(pcm, hop, q).tolist(), expected)
+
+    def test_has_any_speech(self):
+        def fake_blocks(frames):
+            def blocks(audio_path, info):
+                yield frames.ravel()
+                info['duration'] = len(frames) * vad.FRAME_MS / 1000.0
+            return blocks
+
+        # Peaks over the onset level but shorter than 100ms don't count
+        blip = self._frames([0.001] * 10 + [0.3] * 2 + [0.001] * 10)
+        # A quiet tail (between offset and onset) extends a run that started loud
+        word = self._frames([0.001] * 10 + [0.1] * 2 + [0.015] * 3 + [0.001] * 10)
+        # Quiet frames alone never start a run
+        murmur = self._frames([0.015] * 20)
+        for frames, expected in ((blip, False), (word, True), (murmur, False)):
+            with patch.object(vad, '_iter_pcm_blocks', fake_blocks(frames)):
+                self.assertEqual(vad.has_any_speech('audio.mp3'), expected)
+
+        # Decoding failed (no duration): let the transcription step decide
+        def failed_blocks(audio_path, info):
+            yield from ()
+        with patch.object(vad, '_iter_pcm_blocks', failed_blocks):
+            self.assertTrue(vad.has_any_speech('audio.mp3'))
+
+    def test_transcribe_streamed_segments(self):
+        # Every streamed VAD segment is extracted, transcribed and kept in order
+        spans = [(i * 2000, i * 2000 + 1000) for i in range(12)]
+
+        def fake_transcribe(client, extracted, i, start_ms, end_ms, *args):
+            return i, [{'start': start_ms / 1000, 'end': end_ms / 1000, 'text': f"segment {i}"}]
+
+        def stream(*args, info, **kwargs):
+            yield from spans
+            info['duration'] = 24.0  # set once the decode reaches the end
+
+        with patch.object(os.path, 'exists', return_value=True), \
+             patch.object(vad, 'detect_speech_segments_stream', stream), \
+             patch.object(transcriber.audio_splitter, 'get_audio_codec', return_value='mp3'), \
+             patch.object(transcriber, '_extract_segment_to_bytes', return_value=(b'audio', 'mp3')), \
+             patch.object(transcriber, '_transcribe_single_segment', fake_transcribe):
+            result = transcriber.transcribe_audio(None, 'audio.mp3', use_vad=True)
+        self.assertEqual([s['text'] for s in result.segments], [f"segment {i}" for i in range(12)])
+        self.assertTrue(result.complete)
+
+    def test_transcribe_failed_segment_is_incomplete(self):
+        # A failed segment is dropped from the text and marks the result incomplete
+        spans = [(0, 1000), (2000, 3000), (4000, 5000)]
+
+        def fake_transcribe(client, extracted, i, start_ms, end_ms, *args):
+            if i == 1:
+                return i, None
+            return i, [{'start': start_ms / 1000, 'end': end_ms / 1000, 'text': f"segment {i}"}]
+
+        def stream(*args, info, **kwargs):
+            info['duration'] = 5.0
+            return iter(spans)
+
+        with patch.object(os.path, 'exists', return_value=True), \
+             patch.object(vad, 'detect_speech_segments_stream', stream), \
+             patch.object(transcriber.audio_splitter, 'get_audio_codec', return_value='mp3'), \
+             patch.object(transcriber, '_extract_segment_to_bytes', return_value=(b'audio', 'mp3')), \
+             patch.object(transcriber, '_transcribe_single_segment', fake_transcribe):
+            result = transcriber.transcribe_audio(None, 'audio.mp3', use_vad=True)
+        self.assertEqual([s['text'] for s in result.segments], ["segment 0", "segment 2"])
+        self.assertFalse(result.complete)
+
+    def test_transcribe_silent_audio(self):
+        def silent_stream(*args, info, **kwargs):
+            info['duration'] = 30.0  # decoded to the end, no speech found
+            return iter(())
+
+        with patch.object(os.path, 'exists', return_value=True), \
+             patch.object(vad, 'detect_speech_segments_stream', silent_stream), \
+             patch.object(transcriber, '_transcribe_file') as transcribe_file:
+            result = transcriber.transcribe_audio(None, 'audio.mp3', use_vad=True)
+        self.assertTrue(result.no_speech)
+        self.assertEqual(result.segments, [])
+        transcribe_file.assert_not_called()
+
+    def test_speech_from_silent_mask(self):
+        # 1s silence, 2s speech, 0.5s silence (too short to split), 1s speech, 1.5s silence
+        frames_per_sec = 1000 // vad.FRAME_MS
+        silent = np.array([True] * frames_per_sec + [False] * 2 * frames_per_sec
+                          + [True] * (frames_per_sec // 2) + [False] * frames_per_sec
+                          + [True] * (3 * frames_per_sec // 2))
+        runs = list(vad._iter_silence_runs([silent], 1000))
+        self.assertEqual(runs, [(0, 50), (225, 300)])
+        silences = [(start / frames_per_sec, end / frames_per_sec) for start, end in runs]
+        self.assertEqual(vad._speech_from_silences(silences, len(silent) / frames_per_sec, padding=200), [(800, 4700)])
+
+    def test_silence_runs_across_chunks(self):
+        # Frames 0-60 silent, 60-70 loud, 70-100 silent (600ms, too short),
+        # 100-105 loud, 105-185 silent up to the end
+        silent = np.array([True] * 60 + [False] * 10 + [True] * 30 + [False] * 5 + [True] * 80)
+        # Split the mask inside runs, including a one-frame chunk
+        chunks = np.array_split(silent, [7, 50, 51, 130, 182])
+        self.assertEqual(list(vad._iter_silence_runs(chunks, 1000)), [(0, 60), (105, 185)])
+
+    def test_padding_overlaps_are_merged(self):
+        # Speech 0-1s, 1.3-2s, 5-6s; 200ms padding makes the first two overlap
+        silences = [(1.0, 1.3), (2.0, 5.0)]
+        self.assertEqual(vad._speech_from_silences(silences, 6.0, padding=200), [(0, 2200), (4800, 6000)])
+
+    def test_failed_decode_has_no_tail(self):
+        # Without a duration (decoding stopped early) nothing is assumed past the last silence
+        info = {}
+        segments = list(vad._iter_speech_segments(iter([(1.0, 1.3), (2.0, 5.0)]), info, padding=200))
+        self.assertEqual(segments, [(0, 2200)])
+        self.assertNotIn('duration', info)
+
+    def test_periodic_windows(self):
+        # No ffmpeg/ffprobe call when the duration is known
+        windows = vad.detect_speech_segments(__file__, method='periodic', window_ms=30000, duration=70.5)
+        self.assertEqual(windows, [(0, 30000), (30000, 60000), (60000, 70500)])
+
+    def test_iter_silencedetect(self):
+        # stderr lines as ffmpeg streams them, newlines included
+        lines = [
+            "Input #0, mp3, from 'audio.mp3':\n",
+            "  Duration: 00:01:02.50, start: 0.000000, bitrate: 128 kb/s\n",
+            "[silencedetect @ 0x1] silence_start: 0\n",
+            "[silencedetect @ 0x1] silence_end: 1.5 | silence_duration: 1.5\n",
+            "[silencedetect @ 0x1] silence_start: 10.25\n",
+        ]
+        info = {}
+        silences = vad._iter_silencedetect(iter(lines), info)
+        self.assertEqual(next(silences), (0.0, 1.5))
+        self.assertNotIn('duration', info)  # only known once the output ends
+        # Trailing silence without an end runs to EOF
+        self.assertEqual(list(silences), [(10.25, 62.5)])
+        self.assertEqual(info['duration'], 62.5)
+
+        # No Duration line: no trailing silence and no duration
+        info = {}
+        self.assertEqual(list(vad._iter_silencedetect(iter(lines[2:]), info)), [(0.0, 1.5)])
+        self.assertNotIn('duration', info)
+
+if __name__ == '__main__':
+    unittest.main()
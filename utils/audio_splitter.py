@@ -2,6 +2,10 @@ import os
 import subprocess
 import math
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+# A stream-copied chunk smaller than this is treated as a failed cut.
+MIN_CHUNK_BYTES = 1024
 
 def get_audio_duration(file_path):
     """
@@ -21,10 +25,41 @@ def get_audio_duration(file_path):
         print(f"Error getting duration: {e}")
         return None
 
-def split_audio(file_path, chunk_size_mb=24):
+def get_audio_codec(file_path):
+    """
+    Get the codec name of the first audio stream (e.g. 'aac', 'opus', 'mp3')
+    using ffprobe, or None if it can't be determined.
+    """
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'stream=codec_name',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        file_path
+    ]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        return result.stdout.strip() or None
+    except Exception as e:
+        print(f"Error getting codec: {e}")
+        return None
+
+def split_audio(file_path, chunk_size_mb=24, duration=None):
     """
     Splits the audio file into chunks smaller than chunk_size_mb.
-    Returns a list of file paths for the chunks.
+    Returns a list of (chunk_path, duration_sec) tuples. duration_sec is the
+    length the chunk was cut to (None for an unsplit file of unknown length).
+    duration: audio length in seconds if already known (e.g. from yt-dlp
+    metadata); ffprobe is only run when it isn't supplied.
+    """
+    return list(iter_audio_chunks(file_path, chunk_size_mb, duration))
+
+def iter_audio_chunks(file_path, chunk_size_mb=24, duration=None):
+    """
+    Generator version of split_audio: yields (chunk_path, duration_sec) in
+    order, each one as soon as its ffmpeg job has finished, so callers can
+    start working on the first chunks while the rest are still being cut.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
@@ -32,9 +67,11 @@ def split_audio(file_path, chunk_size_mb=24):
     file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
     
     if file_size_mb <= chunk_size_mb:
-        return [file_path]
+        yield file_path, duration
+        return
 
-    duration = get_audio_duration(file_path)
+    if not duration:
+        duration = get_audio_duration(file_path)
     if not duration:
         raise Exception("Could not determine audio duration.")
 
@@ -56,56 +93,67 @@ def split_audio(file_path, chunk_size_mb=24):
     safe_chunk_duration = duration / safe_num_chunks
 
     base_name, ext = os.path.splitext(file_path)
-    chunk_files = []
 
     print(f"Splitting {file_path} ({file_size_mb:.2f}MB, {duration:.2f}s) into {safe_num_chunks} chunks of ~{safe_chunk_duration:.2f}s each.")
 
-    for i in range(safe_num_chunks):
-        start_time = i * safe_chunk_duration
-        output_file = f"{base_name}_part{i}.m4a"
-        
-        # ffmpeg -i input.mp3 -ss 00:00:30 -t 00:00:10 -c copy output.m4a
-        # allow re-encoding if copy fails or to ensure clean cuts? 
-        # Whisper supports mp3, mp4, mpeg, mpga, m4a, wav, and webm.
-        # -c copy is fast but might result in slightly inaccurate cuts or timestamp issues at boundaries.
-        # Re-encoding is safer for timestamp accuracy.
-        
-        cmd = [
-            'ffmpeg',
-            '-y', # Overwrite
-            '-i', file_path,
-            '-ss', str(start_time),
-            '-t', str(safe_chunk_duration),
-            '-c', 'copy', # Try copy first
-            output_file
+    # Each ffmpeg job is independent, so run them side by side
+    # (threads are enough: the work happens in ffmpeg).
+    max_workers = min(safe_num_chunks, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_extract_chunk, file_path, base_name, ext, i,
+                            i * safe_chunk_duration, safe_chunk_duration)
+            for i in range(safe_num_chunks)
         ]
-        
-        # If copy causes issues (e.g. starting with empty frames), we might need re-encoding
-        # specific for whisper. But let's try copy first as it's fast. 
-        # Actually, copy can cause issues with "start time" metadata not being 0.
-        # Using -c:a libmp3lame -q:a 2 (if mp3) might be better but slower.
-        
-        # Let's stick to -c copy for speed, but verify.
-        # Actually, for Whisper, we want the file to start at 0 timestamp internally, 
-        # otherwise it might mess up "relative" timestamps.
-        # ffmpeg -ss before -i ... is faster and resets timestamp.
-        
-        cmd = [
-            'ffmpeg',
-            '-y',
-            '-ss', str(start_time),
-            '-t', str(safe_chunk_duration),
-            '-i', file_path,
-            '-acodec', 'aac',
-            output_file
-        ]
-        
-        try:
-            subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            chunk_files.append(output_file)
-        except subprocess.CalledProcessError as e:
-            print(f"Error splitting chunk {i}: {e}")
-            # If copy fails, maybe try re-encoding (implementation detail omitted for now)
-            raise e
+        for i, future in enumerate(futures):
+            try:
+                chunk_file = future.result()
+            except subprocess.CalledProcessError as e:
+                print(f"Error splitting chunk {i}: {e.stderr.decode(errors='replace')[:200]}")
+                raise e
+            yield chunk_file, safe_chunk_duration
+
+def _extract_chunk(file_path, base_name, ext, index, start_time, chunk_duration):
+    """
+    Cuts one chunk out of file_path and returns its path.
+    Stream-copies the source codec (no re-encode); falls back to an AAC
+    re-encode if the copy fails or produces an implausibly small file.
+    """
+    # -ss before -i seeks on the input, so the chunk's own timestamps start
+    # at 0 (Whisper timestamps are relative to the chunk).
+    # MP3 and AAC are frame based, so a copy cut is off by at most one frame.
+    output_file = f"{base_name}_part{index}{ext}"
+    cmd = [
+        'ffmpeg',
+        '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-y',
+        '-ss', str(start_time),
+        '-t', str(chunk_duration),
+        '-i', file_path,
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        output_file
+    ]
+    try:
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        if os.path.getsize(output_file) >= MIN_CHUNK_BYTES:
+            return output_file
+        print(f"Stream copy of chunk {index} looks truncated, re-encoding.")
+    except subprocess.CalledProcessError as e:
+        print(f"Stream copy of chunk {index} failed ({e.stderr.decode(errors='replace')[:200]}), re-encoding.")
+    if os.path.exists(output_file):
+        os.remove(output_file)
 
-    return chunk_files
+    output_file = f"{base_name}_part{index}.m4a"
+    cmd = [
+        'ffmpeg',
+        '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-y',
+        '-ss', str(start_time),
+        '-t', str(chunk_duration),
+        '-i', file_path,
+        '-acodec', 'aac',
+        output_file
+    ]
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    return output_file
@@ -0,0 +1,51 @@
+import gzip
+import hashlib
+import json
+import os
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "llm-subtitles")
+
+# Only the head of the audio file is hashed (plus its size), which is enough
+# to tell downloads apart without reading hundreds of MB on every run.
+KEY_SAMPLE_BYTES = 1 << 20
+
+def make_key(audio_path, **params):
+    """
+    Builds a cache key from the audio file content and the settings that
+    affect the transcription (engine, language, prompt, ...).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(audio_path, 'rb') as f:
+        h.update(f.read(KEY_SAMPLE_BYTES))
+    h.update(str(os.path.getsize(audio_path)).encode('ascii'))
+    h.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.json.gz")
+
+def get(key):
+    """
+    Returns the cached segments list for key, or None on a miss.
+    """
+    path = _entry_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable cache entry {path}: {e}")
+        return None
+
+def put(key, segments):
+    """
+    Stores a segments list (JSON-serializable dicts) under key.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    # Write then rename so an interrupted run never leaves a partial entry
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(segments, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
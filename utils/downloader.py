@@ -2,6 +2,14 @@ import yt_dlp
 import os
 import re
 
+# Transfer tuning shared by the downloading calls: larger HTTP ranges and read
+# buffer, plus parallel fragments for DASH/HLS streams.
+DOWNLOAD_TRANSFER_OPTS = {
+    'http_chunk_size': 10 * 1024 * 1024,
+    'concurrent_fragment_downloads': 4,
+    'buffersize': 1024 * 1024,
+}
+
 def _yt_dlp_progress_hook(d, hook_fn):
     if d['status'] == 'downloading':
         # p is usually a string like " 45.0%" or "N/A%"
@@ -14,41 +22,70 @@ def _yt_dlp_progress_hook(d, hook_fn):
         if hook_fn:
             hook_fn("100%")
 
-def get_video_info(url):
+class Downloader:
     """
-    Retrieves video metadata and available subtitles.
+    Downloads the pieces of a video (info, subtitles, audio) while extracting
+    the video info only once per URL.
+
+    yt-dlp's extraction (webpage + player requests) is the slow part, so the
+    info extracted by info() is handed to the subtitle/audio downloads through
+    process_ie_result instead of letting each step extract it again.
     """
-    ydl_opts = {
+
+    # Options for info extraction (shared YoutubeDL instance)
+    BASE_OPTS = {
         'skip_download': True,
         'quiet': True,
         'no_warnings': True,
+        'lazy_playlist': True,
     }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        try:
-            info = ydl.extract_info(url, download=False)
-            return info
-        except Exception as e:
-            print(f"Error extracting video info: {e}")
-            return None
 
-def download_manual_subtitle(url, lang_code, output_path, progress_hook=None):
-    """
-    Downloads the manual subtitle for the given language code.
-    """
-    ydl_opts = {
-        'skip_download': True,
-        'writesubtitles': True,
-        'subtitleslangs': [lang_code],
-        'outtmpl': output_path,
-        'quiet': True,
-    }
-    
-    if progress_hook:
-        ydl_opts['progress_hooks'] = [lambda d: _yt_dlp_progress_hook(d, progress_hook)]
+    def __init__(self):
+        self.ydl = yt_dlp.YoutubeDL(self.BASE_OPTS)
+        self._infos = {}
+
+    def close(self):
+        """
+        Closes the shared YoutubeDL instance (cookie jar, open handlers).
+        """
+        self.ydl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def info(self, url):
+        """
+        Retrieves video metadata and available subtitles (cached per URL).
+        """
+        if url not in self._infos:
+            try:
+                self._infos[url] = self.ydl.extract_info(url, download=False)
+            except Exception as e:
+                print(f"Error extracting video info: {e}")
+                return None
+        return self._infos[url]
+
+    def subtitle(self, url, lang_code, output_path, progress_hook=None):
+        """
+        Downloads the manual subtitle for the given language code.
+        """
+        ydl_opts = {
+            'skip_download': True,
+            'writesubtitles': True,
+            'subtitleslangs': [lang_code],
+            'outtmpl': output_path,
+            'quiet': True,
+            **DOWNLOAD_TRANSFER_OPTS,
+        }
+        
+        if progress_hook:
+            ydl_opts['progress_hooks'] = [lambda d: _yt_dlp_progress_hook(d, progress_hook)]
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         try:
-            ydl.download([url])
+            self._download(url, ydl_opts)
             # yt-dlp appends the lang code to the filename, e.g., filename.en.vtt
             # We might need to rename it or return the actual filename
             expected_filename = f"{output_path}.{lang_code}.vtt" # Default usually vtt
@@ -57,31 +94,74 @@ def download_manual_subtitle(url, lang_code, output_path, progress_hook=None):
             print(f"Error downloading subtitle: {e}")
             return None
 
-def download_audio(url, output_path, progress_hook=None):
-    """
-    Downloads audio from the video, converting to MP3.
-    """
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'outtmpl': output_path, # .mp3 will be appended by postprocessor
-        'quiet': True,
-    }
-    
-    if progress_hook:
-        ydl_opts['progress_hooks'] = [lambda d: _yt_dlp_progress_hook(d, progress_hook)]
+    def audio(self, url, output_path, progress_hook=None):
+        """
+        Downloads audio from the video, converting to MP3.
+        Returns (audio_path, duration_sec); duration comes from the video
+        metadata and may be None. Returns (None, None) on failure.
+        """
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }],
+            'outtmpl': output_path, # .mp3 will be appended by postprocessor
+            'quiet': True,
+            **DOWNLOAD_TRANSFER_OPTS,
+        }
         
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
+        if progress_hook:
+            ydl_opts['progress_hooks'] = [lambda d: _yt_dlp_progress_hook(d, progress_hook)]
+            
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         try:
-            ydl.download([url])
-            return f"{output_path}.mp3"
+            info = self._download(url, ydl_opts)
+            return f"{output_path}.mp3", info.get('duration') if info else None
         except Exception as e:
             print(f"Error downloading audio: {e}")
-            return None
+            return None, None
+
+    def _download(self, url, ydl_opts):
+        """
+        Runs a download with ydl_opts, starting from the cached info when
+        there is one. Returns the processed info dict.
+        """
+        # Format selection, postprocessors and hooks are fixed when a YoutubeDL
+        # is constructed, so each download step gets its own (cheap) instance.
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = self._infos.get(url)
+            if info:
+                try:
+                    return ydl.process_ie_result(ydl.sanitize_info(info), download=True)
+                except yt_dlp.utils.DownloadError as e:
+                    # e.g. expired format URLs: extract again
+                    print(f"Download from cached info failed ({e}), extracting again...")
+            return ydl.extract_info(url, download=True)
+
+# Module-level helpers for one-off calls: each uses (and closes) its own
+# Downloader. Use a Downloader directly to share info across calls.
+def get_video_info(url):
+    """
+    Retrieves video metadata and available subtitles.
+    """
+    with Downloader() as dl:
+        return dl.info(url)
+
+def download_manual_subtitle(url, lang_code, output_path, progress_hook=None):
+    """
+    Downloads the manual subtitle for the given language code.
+    """
+    with Downloader() as dl:
+        return dl.subtitle(url, lang_code, output_path, progress_hook)
+
+def download_audio(url, output_path, progress_hook=None):
+    """
+    Downloads audio from the video, converting to MP3.
+    Returns (audio_path, duration_sec), or (None, None) on failure.
+    """
+    with Downloader() as dl:
+        return dl.audio(url, output_path, progress_hook)
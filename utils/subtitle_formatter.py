@@ -1,101 +1,148 @@
 import re
 import os
+from itertools import zip_longest
+
+# Segments buffered per write() when generating SRT files. Large enough to
+# amortize the per-call overhead, small enough to bound memory on huge files.
+WRITE_BATCH_SEGMENTS = 4096
+
+# File buffer for subtitle reads/writes (the 8 KiB default means many refills
+# on multi-MB auto-generated subtitles).
+IO_BUFFER_SIZE = 1 << 20
+
+# Cue timestamp, shared by VTT (MM:SS.mmm / HH:MM:SS.mmm) and SRT (HH:MM:SS,mmm).
+_TIMESTAMP_RE = re.compile(r'(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})')
+
+def _time_to_seconds(time_str):
+    """
+    Converts a VTT or SRT timestamp to seconds.
+    Trailing text (e.g. VTT cue settings) is ignored. Raises ValueError if
+    the string doesn't start with a timestamp.
+    """
+    match = _TIMESTAMP_RE.match(time_str)
+    if not match:
+        raise ValueError(f"Invalid timestamp: {time_str!r}")
+    hours, minutes, seconds, millis = match.groups()
+    return (int(hours or 0) * 3600 + int(minutes) * 60
+            + int(seconds) + int(millis) / 1000.0)
 
 def format_timestamp(seconds):
     """
     Converts seconds to SRT timestamp format (00:00:00,000).
     """
-    millis = int((seconds - int(seconds)) * 1000)
-    minutes, seconds = divmod(int(seconds), 60)
+    # Integer milliseconds, rounded, so e.g. 0.29 doesn't become 00:00:00,289
+    millis = int(seconds * 1000 + 0.5)
+    seconds, millis = divmod(millis, 1000)
+    minutes, seconds = divmod(seconds, 60)
     hours, minutes = divmod(minutes, 60)
-    return f"{hours:02}:{minutes:02}:{seconds:02},{millis:03}"
+    return "%02d:%02d:%02d,%03d" % (hours, minutes, seconds, millis)
 
 def parse_vtt(vtt_file_path):
     """
     Parses a WEBVTT file and returns a list of segments.
     Each segment is a dict: {'start': float, 'end': float, 'text': str}
     """
-    segments = []
-    with open(vtt_file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    with open(vtt_file_path, 'r', encoding='utf-8', buffering=IO_BUFFER_SIZE) as f:
+        return _parse_vtt_stream(f)
 
+def _parse_vtt_stream(fp):
+    """
+    parse_vtt on an open text stream (file object, io.StringIO, ...).
+    """
     # Simple VTT parser. 
     # VTT format:
     # 00:00:00.000 --> 00:00:02.000
     # Text line 1
     # Text line 2
+    #
+    # Lines are consumed as they are read; each blank line closes a block.
+    segments = []
+    block = []
     
-    # Regex to find timestamps: (\d{2}:)?\d{2}:\d{2}\.\d{3} --> (\d{2}:)?\d{2}:\d{2}\.\d{3}
-    # But often it's simpler to iterate blocks.
-    
-    blocks = content.strip().split('\n\n')
+    for line in fp:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            block.append(line)
+        elif block:
+            _add_vtt_block(block, segments)
+            block = []
     
-    for block in blocks:
-        lines = block.split('\n')
-        # Filter out header 'WEBVTT' or notes
-        if lines[0].strip() == "WEBVTT" or lines[0].startswith("NOTE"):
-            continue
-            
-        # Find the timestamp line
-        time_line_index = -1
-        for i, line in enumerate(lines):
-            if '-->' in line:
-                time_line_index = i
-                break
-        
-        if time_line_index == -1:
-            continue
-            
-        time_line = lines[time_line_index]
-        text_lines = lines[time_line_index+1:]
-        text = "\n".join(text_lines).strip()
-        
-        # Parse start and end times
-        try:
-            start_str, end_str = time_line.split(' --> ')
-            start = _vtt_time_to_seconds(start_str.strip())
-            end = _vtt_time_to_seconds(end_str.split(' ')[0].strip()) # clean potential settings
-            
-            segments.append({
-                'start': start,
-                'end': end,
-                'text': text
-            })
-        except ValueError:
-            continue
+    if block:
+        _add_vtt_block(block, segments)
             
     return segments
 
-def _vtt_time_to_seconds(time_str):
-    # format: MM:SS.mmm or HH:MM:SS.mmm
-    parts = time_str.split(':')
-    seconds = 0
-    if len(parts) == 3:
-        seconds += int(parts[0]) * 3600
-        seconds += int(parts[1]) * 60
-        seconds += float(parts[2])
-    elif len(parts) == 2:
-        seconds += int(parts[0]) * 60
-        seconds += float(parts[1])
-    return seconds
+def _add_vtt_block(lines, segments):
+    """
+    Appends the cue held in one VTT block (list of lines) to segments.
+    Header, NOTE and malformed blocks are ignored.
+    """
+    # Filter out notes (they may contain '-->' in free text).
+    # The 'WEBVTT' header has no timing line and falls through below.
+    if lines[0].startswith("NOTE"):
+        return
+        
+    # Find the timestamp line (an optional cue identifier may precede it)
+    for time_line_index, time_line in enumerate(lines):
+        if '-->' in time_line:
+            break
+    else:
+        return
+    
+    start_str, _, end_str = time_line.partition('-->')
+    try:
+        start = _time_to_seconds(start_str.strip())
+        end = _time_to_seconds(end_str.strip()) # trailing cue settings are ignored
+    except ValueError:
+        return
+    
+    segments.append({
+        'start': start,
+        'end': end,
+        'text': "\n".join(lines[time_line_index+1:]).strip()
+    })
 
 def generate_srt(segments, output_path):
     """
     Generates an SRT file from a list of segments.
     Segments should have 'start', 'end', and 'text'.
     """
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for i, segment in enumerate(segments):
-            start = format_timestamp(segment['start'])
-            end = format_timestamp(segment['end'])
-            text = segment.get('text', '').strip()
-            
-            f.write(f"{i+1}\n")
-            f.write(f"{start} --> {end}\n")
-            f.write(f"{text}\n\n")
+    # Binary mode: each batch is encoded once, no TextIOWrapper per write
+    with open(output_path, 'wb', buffering=IO_BUFFER_SIZE) as f:
+        for chunk in _iter_srt_chunks(segments):
+            f.write(chunk.encode('utf-8'))
     
     return output_path
 
+def render_srt_bytes(segments):
+    """
+    Returns the UTF-8 encoded SRT file content for segments.
+    """
+    return "".join(_iter_srt_chunks(segments)).encode('utf-8')
+
+def _generate_srt_stream(segments, fp):
+    """
+    generate_srt into an open text stream.
+    """
+    for chunk in _iter_srt_chunks(segments):
+        fp.write(chunk)
+
+def _iter_srt_chunks(segments):
+    """
+    Yields the SRT text for segments, WRITE_BATCH_SEGMENTS cues per string.
+    """
+    out = []
+    for i, segment in enumerate(segments):
+        start = format_timestamp(segment['start'])
+        end = format_timestamp(segment['end'])
+        text = segment.get('text', '').strip()
+        
+        out.append(f"{i+1}\n{start} --> {end}\n{text}\n\n")
+        if len(out) >= WRITE_BATCH_SEGMENTS:
+            yield "".join(out)
+            out = []
+    yield "".join(out)
+
 def generate_bilingual_srt(original_segments, translated_segments, output_path):
     """
     Generates a bilingual SRT file.
@@ -105,89 +152,116 @@ def generate_bilingual_srt(original_segments, translated_segments, output_path):
     Translated Text
     Original Text
     """
-    with open(output_path, 'w', encoding='utf-8') as f:
-        # Use translated segments as the base for timing if available, or original.
-        # Usually original has better timing if translated was just text list.
-        # But here our translator preserves dict structure.
-        
-        count = max(len(original_segments), len(translated_segments))
-        
-        for i in range(count):
-            # Get translated text
-            trans_text = ""
-            if i < len(translated_segments):
-                trans_text = translated_segments[i]['text']
-                # Use translated timing? Or original?
-                start = format_timestamp(translated_segments[i]['start'])
-                end = format_timestamp(translated_segments[i]['end'])
-            else:
-                 # Fallback timing
-                 start = "00:00:00,000" 
-                 end = "00:00:00,000"
-
-            # Get original text
-            orig_text = ""
-            if i < len(original_segments):
-                orig_text = original_segments[i]['text']
-                # If we rely on original timing (often safer)
-                start = format_timestamp(original_segments[i]['start'])
-                end = format_timestamp(original_segments[i]['end'])
-            
-            # Combine
-            # Style: Translated on top (Target), Original below.
-            texts_to_combine = []
-            if trans_text.strip():
-                texts_to_combine.append(trans_text.strip())
-            if orig_text.strip():
-                texts_to_combine.append(orig_text.strip())
-                
-            combined_text = "\n".join(texts_to_combine)
-            
-            f.write(f"{i+1}\n")
-            f.write(f"{start} --> {end}\n")
-            f.write(f"{combined_text}\n\n")
+    with open(output_path, 'wb', buffering=IO_BUFFER_SIZE) as f:
+        for chunk in _iter_bilingual_srt_chunks(original_segments, translated_segments):
+            f.write(chunk.encode('utf-8'))
     
     return output_path
 
+def render_bilingual_bytes(original_segments, translated_segments):
+    """
+    Returns the UTF-8 encoded content of generate_bilingual_srt's file.
+    """
+    return "".join(_iter_bilingual_srt_chunks(original_segments, translated_segments)).encode('utf-8')
+
+def _generate_bilingual_srt_stream(original_segments, translated_segments, fp):
+    """
+    generate_bilingual_srt into an open text stream.
+    """
+    for chunk in _iter_bilingual_srt_chunks(original_segments, translated_segments):
+        fp.write(chunk)
+
+def _iter_bilingual_srt_chunks(original_segments, translated_segments):
+    """
+    Yields the bilingual SRT text, WRITE_BATCH_SEGMENTS cues per string.
+    """
+    # Use translated segments as the base for timing if available, or original.
+    # Usually original has better timing if translated was just text list.
+    # But here our translator preserves dict structure.
+    
+    out = []
+    
+    for i, (orig, trans) in enumerate(zip_longest(original_segments, translated_segments)):
+        # Timing: rely on original timing when present (often safer),
+        # otherwise the translated segment's.
+        timing = orig or trans
+        start = format_timestamp(timing['start'])
+        end = format_timestamp(timing['end'])
+        
+        # Combine
+        # Style: Translated on top (Target), Original below.
+        trans_text = trans['text'].strip() if trans else ''
+        orig_text = orig['text'].strip() if orig else ''
+        combined_text = f"{trans_text}\n{orig_text}" if trans_text and orig_text else (trans_text or orig_text)
+        
+        out.append(f"{i+1}\n{start} --> {end}\n{combined_text}\n\n")
+        if len(out) >= WRITE_BATCH_SEGMENTS:
+            yield "".join(out)
+            out = []
+    yield "".join(out)
+
+# parse_srt states: waiting for the cue index, the timing line, or text lines.
+_SRT_INDEX, _SRT_TIME, _SRT_TEXT, _SRT_SKIP = range(4)
+
 def parse_srt(srt_file_path):
     """
     Parses an SRT file into segments list.
     """
-    segments = []
     if not os.path.exists(srt_file_path):
         return []
-        
-    with open(srt_file_path, 'r', encoding='utf-8') as f:
-        content = f.read().strip()
-        
-    blocks = re.split(r'\n\n+', content)
-    
-    for block in blocks:
-        lines = block.strip().split('\n')
-        if len(lines) < 3:
+
+    with open(srt_file_path, 'r', encoding='utf-8', buffering=IO_BUFFER_SIZE) as f:
+        return _parse_srt_stream(f)
+
+def _parse_srt_stream(fp):
+    """
+    parse_srt on an open text stream.
+    Single pass over the lines; each cue is index, timing line, text lines.
+    """
+    segments = []
+    state = _SRT_INDEX
+    start = end = 0.0
+    text_lines = []
+
+    for line in fp:
+        line = line.rstrip('\r\n')
+
+        if not line.strip():
+            # Blank line closes the current cue
+            if state == _SRT_TEXT and text_lines:
+                segments.append({
+                    'start': start,
+                    'end': end,
+                    'text': "\n".join(text_lines).strip()
+                })
+            state = _SRT_INDEX
+            text_lines = []
             continue
-            
-        # Line 0: ID
-        # Line 1: Time
-        # Line 2+: Text
-        
-        time_line = lines[1]
-        text = "\n".join(lines[2:])
-        
-        if '-->' in time_line:
-            start_str, end_str = time_line.split(' --> ')
-            start = _srt_time_to_seconds(start_str.strip())
-            end = _srt_time_to_seconds(end_str.strip())
-            
-            segments.append({
-                'start': start,
-                'end': end,
-                'text': text
-            })
-            
-    return segments
 
-def _srt_time_to_seconds(time_str):
-    # 00:00:00,000
-    time_str = time_str.replace(',', '.')
-    return _vtt_time_to_seconds(time_str)
+        if state == _SRT_INDEX:
+            state = _SRT_TIME
+        elif state == _SRT_TIME:
+            if '-->' not in line:
+                # Malformed cue, ignore until the next blank line
+                state = _SRT_SKIP
+                continue
+            start_str, _, end_str = line.partition('-->')
+            try:
+                start = _time_to_seconds(start_str.strip())
+                end = _time_to_seconds(end_str.strip())
+            except ValueError:
+                state = _SRT_SKIP
+                continue
+            state = _SRT_TEXT
+        elif state == _SRT_TEXT:
+            text_lines.append(line)
+
+    # Last cue may not be followed by a blank line
+    if state == _SRT_TEXT and text_lines:
+        segments.append({
+            'start': start,
+            'end': end,
+            'text': "\n".join(text_lines).strip()
+        })
+
+    return segments
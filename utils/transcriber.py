@@ -1,6 +1,16 @@
+import io
+import json
 import os
+import queue
 import subprocess
+import sys
+import threading
+from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from itertools import chain, islice
+
+import numpy as np
 
 from . import audio_splitter
 
@@ -15,96 +25,162 @@ GOOGLE_API_MAX_SEGMENT_MS = 59 * 1000  # 59 seconds
 # content near segment boundaries — a known issue with non-English audio.
 SEGMENT_OVERLAP_MS = 10 * 1000  # 10 seconds
 
+# Model used by the 'whisper' engine (OpenAI API).
+WHISPER_MODEL = "whisper-1"
+# Model used by the local 'faster-whisper' engine (tiny/base/small/medium/large-v3).
+FASTER_WHISPER_MODEL_SIZE = "medium"
+# Speech chunks decoded per forward pass when faster-whisper transcribes a whole file.
+FASTER_WHISPER_BATCH_SIZE = 16
 
-def _filter_hallucinations(segments, max_repeat=5):
+# ffmpeg output settings for extracted segments, as (file extension, args)
+# tried in order. Segments are piped, so every format must be streamable.
+# Whisper segments are stream-copied when the source codec has a container
+# Whisper accepts (see WHISPER_COPY_FORMATS), else re-encoded to MP3. Google
+# needs 16kHz mono FLAC (required by the REST API config below).
+WHISPER_COPY_FORMATS = {
+    'aac': ('m4a', ['-c:a', 'copy', '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov']),
+    'mp3': ('mp3', ['-c:a', 'copy', '-f', 'mp3']),
+    'opus': ('ogg', ['-c:a', 'copy', '-f', 'ogg']),
+    'vorbis': ('ogg', ['-c:a', 'copy', '-f', 'ogg']),
+    'flac': ('flac', ['-c:a', 'copy', '-f', 'flac']),
+}
+WHISPER_ENCODE_FORMAT = ('mp3', ['-c:a', 'libmp3lame', '-b:a', '128k', '-f', 'mp3'])
+GOOGLE_CODEC_ATTEMPTS = (
+    ('flac', ['-acodec', 'flac', '-ar', '16000', '-ac', '1', '-f', 'flac']),
+)
+
+# Word endings where a Google transcript may be split into a new subtitle:
+# single punctuation characters (set lookup) and Thai polite particles.
+_SENTENCE_END_CHARS = frozenset('。？！，.?!,')
+_THAI_SENTENCE_END = ('ครับ', 'ค่ะ')
+
+# Concurrent transcription requests. These wait on the network, so this is
+# independent of (and usually above) the CPU count used for ffmpeg extraction.
+DEFAULT_API_WORKERS = 10
+
+# Read buffer for ffmpeg's stdout pipe.
+PIPE_BUFFER_SIZE = 1 << 20
+
+# Engines that run on this machine. The 25MB Whisper API upload limit (the
+# reason for splitting audio into chunks) doesn't apply to them.
+LOCAL_ENGINES = ('faster-whisper',)
+
+_faster_whisper_model = None
+_faster_whisper_pipeline = None
+_faster_whisper_lock = threading.Lock()
+
+_google_session = None
+_google_session_lock = threading.Lock()
+
+
+def _normalize_segments(segments):
     """
-    Post-processing filter to remove likely hallucinated segments.
-    
-    Strategies:
-    1. Remove any text that appears more than `max_repeat` times total.
-    2. Remove consecutive segments with identical text (keep first occurrence).
-    3. Remove very short meaningless segments (1-2 chars with very short duration).
+    Reads starts, texts and no_speech_probs of dicts / API objects once into
+    flat lists. Texts are stripped at ingestion (see _whisper_transcribe_file),
+    so they are used as is here. Texts are interned, so repeated texts share one
+    object and the grouping / duplicate checks compare by identity instead of
+    character by character.
     """
-    if not segments:
-        return segments
-    
-    def get_text(seg):
-        if isinstance(seg, dict):
-            return seg.get('text', '').strip()
-        return getattr(seg, 'text', '').strip()
-    
-    def get_no_speech_prob(seg):
-        if isinstance(seg, dict):
-            return seg.get('no_speech_prob', 0.0)
-        return getattr(seg, 'no_speech_prob', 0.0)
-    
-    def get_duration(seg):
+    starts = []
+    texts = []
+    no_speech_probs = []
+    for seg in segments:
         if isinstance(seg, dict):
-            return seg.get('end', 0) - seg.get('start', 0)
-        return getattr(seg, 'end', 0) - getattr(seg, 'start', 0)
-    
-    from collections import Counter
-    text_counts = Counter(get_text(s) for s in segments)
-    total_segments = len(segments)
+            starts.append(seg.get('start', 0))
+            texts.append(sys.intern(seg.get('text') or ''))
+            no_speech_probs.append(seg.get('no_speech_prob', 0.0))
+        else:
+            starts.append(getattr(seg, 'start', 0))
+            texts.append(sys.intern(getattr(seg, 'text', None) or ''))
+            no_speech_probs.append(getattr(seg, 'no_speech_prob', 0.0))
+    return starts, texts, no_speech_probs
+
+
+def _hallucination_filter_indices(texts, no_speech_probs, indices, max_repeat=5):
+    """Indices (a subsequence of `indices`) that survive the hallucination filter."""
+    groups = defaultdict(list)  # text -> indices of segments with that text
+    for i in indices:
+        groups[texts[i]].append(i)
+    total_segments = len(indices)
     
     # Flag as hallucination if:
     # - Appears > max_repeat times AND is > 15% of total segments
-    hallucinated_texts = set()
-    for text, count in text_counts.items():
-        if not text:
-            continue
-        if count > max_repeat and count > total_segments * 0.15:
-            hallucinated_texts.add(text)
+    hallucinated_texts = {
+        text for text, idxs in groups.items()
+        if text and len(idxs) > max_repeat and len(idxs) > total_segments * 0.15
+    }
     
     if hallucinated_texts:
         print(f"Hallucination detector: found {len(hallucinated_texts)} repeated text(s):")
         for ht in list(hallucinated_texts)[:5]:
-            print(f'  - "{ht[:80]}..." (appeared {text_counts[ht]} times)')
+            print(f'  - "{ht[:80]}..." (appeared {len(groups[ht])} times)')
     
-    filtered = []
-    prev_text = None
-    removed_count = 0
+    # Skip hallucinated repetitive text
+    dropped = set()
+    for text in hallucinated_texts:
+        dropped.update(groups[text])
     
-    for seg in segments:
-        text = get_text(seg)
-        no_speech = get_no_speech_prob(seg)
-        duration = get_duration(seg)
-        
-        # Skip empty text
-        if not text:
-            removed_count += 1
-            continue
-        # Skip high no_speech_prob
-        if no_speech > 0.9:
-            removed_count += 1
-            continue
-        # Skip hallucinated repetitive text
-        if text in hallucinated_texts:
-            removed_count += 1
+    kept = []
+    prev_text = None
+    for i in indices:
+        if i in dropped:
             continue
-        # Skip consecutive exact duplicates
-        if text == prev_text:
-            removed_count += 1
+        text = texts[i]
+        # Skip empty text, high no_speech_prob and consecutive exact duplicates
+        if not text or no_speech_probs[i] > 0.9 or text == prev_text:
             continue
-        
-        filtered.append(seg)
+        kept.append(i)
         prev_text = text
+    return kept
+
+
+def _dedup_indices(starts, texts, threshold_sec=1.0):
+    """Indices of the segments kept by deduplication, in start-time order."""
+    # Sort by start time, then compare each start with the currently kept
+    # segment (not the previous start), so evenly spaced segments closer
+    # than threshold_sec don't chain into one cluster
+    order = np.argsort(np.asarray(starts, dtype=np.float64), kind='stable').tolist()
+    kept = [order[0]]
+    
+    for i in order[1:]:
+        if starts[i] - starts[kept[-1]] < threshold_sec:
+            # Keep the one with longer text (more complete)
+            if len(texts[i]) > len(texts[kept[-1]]):
+                kept[-1] = i  # Replace with better version
+        else:
+            kept.append(i)
+    return kept
+
+
+def _filter_hallucinations(segments, max_repeat=5):
+    """
+    Post-processing filter to remove likely hallucinated segments.
     
-    return filtered
+    Strategies:
+    1. Remove any text that appears more than `max_repeat` times total.
+    2. Remove consecutive segments with identical text (keep first occurrence).
+    3. Remove very short meaningless segments (1-2 chars with very short duration).
+    """
+    if not segments:
+        return segments
+    
+    _starts, texts, no_speech_probs = _normalize_segments(segments)
+    kept = _hallucination_filter_indices(texts, no_speech_probs, range(len(segments)), max_repeat)
+    return [segments[i] for i in kept]
 
 
 def _split_long_segments(speech_segments, max_segment_ms):
     """
     Split speech segments that are longer than max_segment_ms into
-    smaller overlapping sub-segments.
+    smaller overlapping sub-segments. Lazy, so it can sit on top of a
+    streaming VAD.
     """
-    result = []
     stride_ms = max(max_segment_ms - SEGMENT_OVERLAP_MS, max_segment_ms // 2)
     
     for start_ms, end_ms in speech_segments:
         duration = end_ms - start_ms
         if duration <= max_segment_ms:
-            result.append((start_ms, end_ms))
+            yield start_ms, end_ms
         else:
             sub_count = 0
             current = start_ms
@@ -112,12 +188,11 @@ def _split_long_segments(speech_segments, max_segment_ms):
                 sub_end = min(current + max_segment_ms, end_ms)
                 # Skip tiny leftover segments (< 5s)
                 if sub_end - current >= 5000 or current == start_ms:
-                    result.append((current, sub_end))
+                    yield current, sub_end
                     sub_count += 1
                 current += stride_ms
             print(f"  Split long segment ({duration/1000:.0f}s) into {sub_count} sub-segments "
                   f"(~{max_segment_ms/1000:.0f}s each, {SEGMENT_OVERLAP_MS/1000:.0f}s overlap)")
-    return result
 
 
 def _deduplicate_segments(segments, threshold_sec=1.0):
@@ -129,103 +204,113 @@ def _deduplicate_segments(segments, threshold_sec=1.0):
     if not segments:
         return segments
     
-    # Sort by start time
-    def get_start(seg):
-        return seg.get('start', 0) if isinstance(seg, dict) else getattr(seg, 'start', 0)
-    def get_text(seg):
-        return (seg.get('text', '').strip() if isinstance(seg, dict) else getattr(seg, 'text', '').strip())
-    
-    sorted_segs = sorted(segments, key=get_start)
-    deduped = [sorted_segs[0]]
-    
-    for seg in sorted_segs[1:]:
-        prev_start = get_start(deduped[-1])
-        curr_start = get_start(seg)
-        # If starts are very close, keep the one with longer text (more complete)
-        if abs(curr_start - prev_start) < threshold_sec:
-            prev_text = get_text(deduped[-1])
-            curr_text = get_text(seg)
-            if len(curr_text) > len(prev_text):
-                deduped[-1] = seg  # Replace with better version
-            # else keep existing
-        else:
-            deduped.append(seg)
+    starts, texts, _no_speech_probs = _normalize_segments(segments)
+    return [segments[i] for i in _dedup_indices(starts, texts, threshold_sec)]
+
+
+def _postprocess_segments(segments, max_repeat=5, threshold_sec=1.0, deduplicate=True):
+    """
+    Deduplication (optional) followed by the hallucination filter, sharing a
+    single normalization pass; the filter only walks the deduplicated indices.
+    Returns (filtered_segments, count_after_dedup).
+    """
+    if not segments:
+        return segments, 0
     
-    return deduped
+    starts, texts, no_speech_probs = _normalize_segments(segments)
+    indices = _dedup_indices(starts, texts, threshold_sec) if deduplicate else range(len(segments))
+    kept = _hallucination_filter_indices(texts, no_speech_probs, indices, max_repeat)
+    return [segments[i] for i in kept], len(indices)
 
 
-def _extract_segment(audio_file_path, start_ms, end_ms, output_path):
-    """Extract a single segment from audio using ffmpeg with re-encoding for precision."""
+def _extract_segment_to_bytes(audio_file_path, start_ms, end_ms, codec_attempts):
+    """
+    Extract a single segment from audio, reading ffmpeg's output from a pipe
+    instead of a temp file. -ss before -i seeks via the container index.
+    codec_attempts is a sequence of (ext, output codec/format args); the next
+    one is tried when ffmpeg fails (e.g. stream copy into an incompatible container).
+    Returns (encoded bytes, ext), or (None, None) on error.
+    """
     start_sec = start_ms / 1000.0
     duration_sec = (end_ms - start_ms) / 1000.0
     
-    cmd = [
-        'ffmpeg', '-y',
-        '-ss', str(start_sec),
-        '-t', str(duration_sec),
-        '-i', audio_file_path,
-        '-acodec', 'aac',
-        output_path
-    ]
-    
-    try:
-        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error extracting segment {start_sec:.1f}-{start_sec+duration_sec:.1f}s: {e.stderr.decode()[:200]}")
-        return False
+    for ext, codec_args in codec_attempts:
+        cmd = [
+            'ffmpeg', '-nostdin',
+            '-ss', str(start_sec),
+            '-t', str(duration_sec),
+            '-i', audio_file_path,
+            '-vn',
+            *codec_args,
+            'pipe:1'
+        ]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=PIPE_BUFFER_SIZE)
+        data, err = proc.communicate()
+        if proc.returncode == 0 and data:
+            return data, ext
+        print(f"Error extracting segment {start_sec:.1f}-{start_sec+duration_sec:.1f}s "
+              f"({' '.join(codec_args)}): {err.decode(errors='replace')[-200:]}")
+    return None, None
 
 
-def _transcribe_single_segment_google(api_key, audio_file_path, seg_index, start_ms, end_ms, lang_code='th-TH'):
+def _get_google_session():
     """
-    Transcribe a single <60s segment using Google Speech API Key (REST).
+    Shared requests.Session for Google Speech calls, so workers reuse
+    keep-alive connections instead of a new TLS handshake per segment.
+    """
+    global _google_session
+    with _google_session_lock:
+        if _google_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=DEFAULT_API_WORKERS, pool_maxsize=DEFAULT_API_WORKERS))
+            _google_session = session
+        return _google_session
+
+
+def _transcribe_single_segment_google(api_key, extracted, seg_index, start_ms, end_ms, lang_code='th-TH'):
+    """
+    Transcribe a single extracted <60s segment using Google Speech API Key (REST).
+    extracted is the (flac_bytes, ext) result of _extract_segment_to_bytes.
     Uses word-level timestamps to split into subtitle-sized segments.
+    Returns (seg_index, segments), or (seg_index, None) if the segment failed.
     """
     import base64
-    import requests
     
     start_sec = start_ms / 1000.0
     duration_sec = (end_ms - start_ms) / 1000.0
-    chunk_path_flac = f"{audio_file_path}_seg_{seg_index}.flac"
     
     # Max words per subtitle line (Thai words are short, so allow more)
     MAX_WORDS_PER_SUB = 12
     
+    flac_bytes, _ext = extracted
+    if flac_bytes is None:
+        return (seg_index, None)
+    
     try:
-        cmd = [
-            'ffmpeg', '-y',
-            '-ss', str(start_sec),
-            '-t', str(duration_sec),
-            '-i', audio_file_path,
-            '-acodec', 'flac',
-            '-ar', '16000',
-            '-ac', '1',
-            chunk_path_flac
-        ]
-        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        
-        with open(chunk_path_flac, "rb") as audio_file:
-            content = base64.b64encode(audio_file.read()).decode('utf-8')
-            
         url = f"https://speech.googleapis.com/v1/speech:recognize?key={api_key}"
-        data = {
-            "config": {
-                "encoding": "FLAC",
-                "sampleRateHertz": 16000,
-                "languageCode": lang_code,
-                "enableAutomaticPunctuation": True,
-                "enableWordTimeOffsets": True,
-                "model": "default"
-            },
-            "audio": {
-                "content": content
-            }
+        config = {
+            "encoding": "FLAC",
+            "sampleRateHertz": 16000,
+            "languageCode": lang_code,
+            "enableAutomaticPunctuation": True,
+            "enableWordTimeOffsets": True,
+            "model": "default"
         }
+        # Assemble the JSON body as bytes around the base64 audio, instead of
+        # decoding it to str and having json re-encode the whole payload.
+        # Base64 output never needs JSON escaping.
+        body = b''.join((
+            b'{"config":', json.dumps(config).encode('utf-8'),
+            b',"audio":{"content":"', base64.b64encode(flac_bytes), b'"}}'
+        ))
         
-        response = requests.post(url, json=data)
+        response = _get_google_session().post(url, data=body, headers={'Content-Type': 'application/json'})
         if response.status_code != 200:
             print(f"  Google API Error {response.status_code}: {response.text}")
-            return (seg_index, [])
+            return (seg_index, None)
             
         result_json = response.json()
         transcript_segments = []
@@ -254,7 +339,8 @@ def _transcribe_single_segment_google(api_key, audio_file_path, seg_index, start
                 chunk_words.append(word_info)
                 
                 # Split at MAX_WORDS_PER_SUB, or at punctuation boundaries
-                is_punct_end = word_info['word'].endswith(('。', '？', '！', '，', '.', '?', '!', ',', 'ครับ', 'ค่ะ'))
+                word = word_info['word']
+                is_punct_end = word[-1:] in _SENTENCE_END_CHARS or word.endswith(_THAI_SENTENCE_END)
                 should_split = (len(chunk_words) >= MAX_WORDS_PER_SUB or 
                                (len(chunk_words) >= 5 and is_punct_end))
                 
@@ -304,72 +390,191 @@ def _transcribe_single_segment_google(api_key, audio_file_path, seg_index, start
 
     except Exception as e:
         print(f"  Error Google transcribing segment {seg_index+1}: {e}")
-        return (seg_index, [])
-    finally:
-        if os.path.exists(chunk_path_flac):
-            os.remove(chunk_path_flac)
+        return (seg_index, None)
+
+
+def _whisper_transcribe_file(client, audio, source_lang=None, whisper_prompt=None):
+    """
+    Transcribes one audio file (a path, or a named binary file object) with the Whisper API.
+    Returns a list of {'start', 'end', 'text'} dicts, timestamps relative to the file.
+    """
+    if isinstance(audio, str):
+        with open(audio, "rb") as af:
+            return _whisper_transcribe_file(client, af, source_lang, whisper_prompt)
+    
+    whisper_kwargs = {
+        'model': WHISPER_MODEL,
+        'file': audio,
+        'response_format': 'verbose_json',
+        'timestamp_granularities': ['segment']
+    }
+    if source_lang:
+        whisper_kwargs['language'] = source_lang
+    if whisper_prompt:
+        whisper_kwargs['prompt'] = whisper_prompt
+    transcript = client.audio.transcriptions.create(**whisper_kwargs)
+    
+    raw_segments = transcript.segments if hasattr(transcript, 'segments') else (
+        transcript.get('segments', []) if isinstance(transcript, dict) else []
+    )
+    
+    # Strip once here; post-processing relies on it
+    return [
+        {'start': seg['start'], 'end': seg['end'], 'text': seg['text'].strip()} if isinstance(seg, dict)
+        else {'start': seg.start, 'end': seg.end, 'text': seg.text.strip()}
+        for seg in raw_segments
+    ]
+
+
+def _get_faster_whisper_model():
+    """
+    Loads the local faster-whisper (CTranslate2) model, once per process.
+    int8 on CPU; int8 weights with float16 compute on CUDA.
+    """
+    global _faster_whisper_model
+    with _faster_whisper_lock:
+        if _faster_whisper_model is None:
+            import ctranslate2
+            from faster_whisper import WhisperModel
+            
+            if ctranslate2.get_cuda_device_count() > 0:
+                device, compute_type = 'cuda', 'int8_float16'
+            else:
+                device, compute_type = 'cpu', 'int8'
+            print(f"Loading faster-whisper model '{FASTER_WHISPER_MODEL_SIZE}' ({device}, {compute_type})...")
+            _faster_whisper_model = WhisperModel(FASTER_WHISPER_MODEL_SIZE, device=device, compute_type=compute_type)
+        return _faster_whisper_model
+
+
+def _get_faster_whisper_pipeline():
+    """
+    Wraps the faster-whisper model in a BatchedInferencePipeline, once per process.
+    Returns None if the installed faster-whisper predates it (< 1.1).
+    """
+    global _faster_whisper_pipeline
+    model = _get_faster_whisper_model()
+    with _faster_whisper_lock:
+        if _faster_whisper_pipeline is None:
+            try:
+                from faster_whisper import BatchedInferencePipeline
+            except ImportError:
+                print("faster-whisper has no BatchedInferencePipeline (needs >= 1.1), transcribing unbatched.")
+                _faster_whisper_pipeline = False
+            else:
+                _faster_whisper_pipeline = BatchedInferencePipeline(model=model)
+        return _faster_whisper_pipeline or None
+
+
+def _faster_whisper_transcribe_file(audio, source_lang=None, whisper_prompt=None, batched=False):
+    """
+    Transcribes one audio file (path or binary file object) locally with faster-whisper.
+    batched: run the library's own VAD and decode FASTER_WHISPER_BATCH_SIZE
+        speech chunks per forward pass (for whole files, not pre-cut segments).
+    Same return format as _whisper_transcribe_file.
+    """
+    pipeline = _get_faster_whisper_pipeline() if batched else None
+    if pipeline is not None:
+        segments, _info = pipeline.transcribe(audio, language=source_lang, initial_prompt=whisper_prompt,
+                                              batch_size=FASTER_WHISPER_BATCH_SIZE)
+    else:
+        model = _get_faster_whisper_model()
+        segments, _info = model.transcribe(audio, language=source_lang, initial_prompt=whisper_prompt)
+    # segments is a lazy generator; iterating it runs the decoding
+    return [{'start': seg.start, 'end': seg.end, 'text': seg.text.strip()} for seg in segments]
 
 
-def _transcribe_single_segment(client, audio_file_path, seg_index, start_ms, end_ms, source_lang=None, whisper_prompt=None):
+def _transcribe_file(client, audio, source_lang=None, whisper_prompt=None, engine='whisper', batched=False):
     """
-    Extract and transcribe a single audio segment.
-    Returns (seg_index, list_of_segments_with_absolute_timestamps) or (seg_index, []) on error.
+    Transcribes one audio file (path or file object) with the Whisper API or local faster-whisper.
+    batched only applies to faster-whisper (see _faster_whisper_transcribe_file).
+    """
+    if engine == 'faster-whisper':
+        return _faster_whisper_transcribe_file(audio, source_lang, whisper_prompt, batched)
+    return _whisper_transcribe_file(client, audio, source_lang, whisper_prompt)
+
+
+def _is_rejected_audio_error(error):
+    """
+    True for a Whisper API error saying the uploaded file couldn't be
+    decoded or its format isn't supported (HTTP 400).
+    """
+    if getattr(error, 'status_code', None) != 400:
+        return False
+    message = str(error).lower()
+    return any(hint in message for hint in ('format', 'decode', 'corrupt', 'unsupported'))
+
+
+def _transcribe_single_segment(client, extracted, seg_index, start_ms, end_ms, source_lang=None, whisper_prompt=None, engine='whisper', reextract=None):
+    """
+    Transcribe a single extracted audio segment.
+    extracted is the (audio_bytes, ext) result of _extract_segment_to_bytes.
+    reextract: optional callable returning a re-encoded extraction, used
+    once if the API rejects the file (e.g. a stream-copied container).
+    Returns (seg_index, list_of_segments_with_absolute_timestamps) or (seg_index, None) on error.
     """
     start_sec = start_ms / 1000.0
     duration_sec = (end_ms - start_ms) / 1000.0
-    chunk_path = f"{audio_file_path}_seg_{seg_index}.m4a"
     
-    # Extract segment
-    if not _extract_segment(audio_file_path, start_ms, end_ms, chunk_path):
-        return (seg_index, [])
+    audio_bytes, ext = extracted
+    if audio_bytes is None:
+        return (seg_index, None)
+    chunk = io.BytesIO(audio_bytes)
+    chunk.name = f"segment_{seg_index}.{ext}"  # The OpenAI SDK derives the format from the name
     
     try:
-        # Transcribe
-        with open(chunk_path, "rb") as af:
-            whisper_kwargs = {
-                'model': 'whisper-1',
-                'file': af,
-                'response_format': 'verbose_json',
-                'timestamp_granularities': ['segment']
-            }
-            if source_lang:
-                whisper_kwargs['language'] = source_lang
-            if whisper_prompt:
-                whisper_kwargs['prompt'] = whisper_prompt
-            transcript = client.audio.transcriptions.create(**whisper_kwargs)
-        
-        # Parse and remap timestamps
-        raw_segments = transcript.segments if hasattr(transcript, 'segments') else (
-            transcript.get('segments', []) if isinstance(transcript, dict) else []
-        )
-        
-        result_segments = []
-        for seg in raw_segments:
-            if isinstance(seg, dict):
-                s_start, s_end, s_text = seg['start'], seg['end'], seg['text']
-            else:
-                s_start, s_end, s_text = seg.start, seg.end, seg.text
-            
-            # Simple offset: add the segment's original start time
-            result_segments.append({
-                'start': s_start + start_sec,
-                'end': s_end + start_sec,
-                'text': s_text
-            })
+        # Transcribe, then remap timestamps
+        # Simple offset: add the segment's original start time
+        result_segments = [
+            {'start': seg['start'] + start_sec, 'end': seg['end'] + start_sec, 'text': seg['text']}
+            for seg in _transcribe_file(client, chunk, source_lang, whisper_prompt, engine)
+        ]
         
         print(f"  Segment {seg_index+1}: {len(result_segments)} text segments "
               f"({start_sec:.0f}s-{start_sec+duration_sec:.0f}s, lang={source_lang or 'auto'})")
         return (seg_index, result_segments)
         
     except Exception as e:
+        if reextract and _is_rejected_audio_error(e):
+            print(f"  Segment {seg_index+1}: API rejected the {ext} file, retrying re-encoded")
+            return _transcribe_single_segment(client, reextract(), seg_index, start_ms, end_ms, source_lang, whisper_prompt, engine)
         print(f"  Error transcribing segment {seg_index+1}: {e}")
-        return (seg_index, [])
-    finally:
-        if os.path.exists(chunk_path):
-            os.remove(chunk_path)
+        return (seg_index, None)
+
+
+class TranscriptResult:
+    """
+    transcribe_audio's result. no_speech is True when VAD decoded the whole
+    audio and found it silent (segments is then empty). complete is False
+    when part of the audio was lost (a segment failed, or VAD stopped before
+    the end), so the result must not be cached.
+    """
+    def __init__(self, segments, no_speech=False, complete=True):
+        self.segments = segments
+        self.no_speech = no_speech
+        self.complete = complete
 
 
-def transcribe_audio(client, audio_file_path, source_lang=None, use_vad=False, whisper_prompt=None, max_segment_sec=None, engine='whisper', google_api_key=None):
+def transcription_settings(engine, use_vad=False, vad_mode='rms'):
+    """
+    Module-level settings that change transcribe_audio's output for engine,
+    beyond its own arguments; part of the transcription cache key.
+    """
+    settings = {
+        'max_segment_ms': GOOGLE_API_MAX_SEGMENT_MS if engine == 'google' else DEFAULT_MAX_SEGMENT_MS,
+        'segment_overlap_ms': SEGMENT_OVERLAP_MS,
+    }
+    if engine == 'whisper':
+        settings['model'] = WHISPER_MODEL
+    elif engine == 'faster-whisper':
+        settings['model'] = FASTER_WHISPER_MODEL_SIZE
+        settings['batch_size'] = FASTER_WHISPER_BATCH_SIZE
+    if use_vad and vad_mode != 'periodic':
+        from . import vad
+        settings['vad'] = [vad.MIN_SILENCE_MS, vad.SILENCE_THRESH, vad.PADDING_MS]
+    return settings
+
+
+def transcribe_audio(client, audio_file_path, source_lang=None, use_vad=False, whisper_prompt=None, max_segment_sec=None, engine='whisper', google_api_key=None, audio_duration=None, max_workers=None, vad_mode='rms'):
     """
     Transcribes audio using OpenAI Whisper or Google Speech.
     
@@ -378,10 +583,16 @@ def transcribe_audio(client, audio_file_path, source_lang=None, use_vad=False, w
         audio_file_path: Path to the audio file.
         source_lang: ISO language code (e.g. 'en', 'ja', 'th').
         use_vad: If True, use Voice Activity Detection.
+        vad_mode: VAD method, see vad.detect_speech_segments ('rms',
+            'silencedetect' or 'periodic').
         whisper_prompt: Optional text prompt (Whisper only).
         max_segment_sec: Max duration per chunk. For Google, FORCE < 60s.
-        engine: 'whisper' or 'google'.
+        engine: 'whisper' (OpenAI API), 'faster-whisper' (local, needs the
+            faster-whisper package) or 'google'.
         google_api_key: API Key for Google Speech.
+        audio_duration: Audio length in seconds if already known (skips ffprobe).
+        max_workers: Concurrent transcription requests for VAD/fixed chunking
+            (default DEFAULT_API_WORKERS). Extraction uses one ffmpeg per CPU.
     """
     if not os.path.exists(audio_file_path):
         raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
@@ -401,22 +612,38 @@ def transcribe_audio(client, audio_file_path, source_lang=None, use_vad=False, w
         use_custom_chunking = (max_segment_sec is not None) or (engine == 'google')  # Google MUST chunk
         
         speech_segments = []
+        # Segments still to come from the streaming VAD, after speech_segments
+        more_segments = iter(())
+        # Set when the segments come from a silence detector, whose decode
+        # must reach the end of the audio for the result to be complete
+        vad_info = None
         
         if use_vad:
             from . import vad
-            speech_segments = vad.detect_speech_segments(audio_file_path)
+            detect_info = {}
+            detected = vad.detect_speech_segments_stream(audio_file_path, method=vad_mode,
+                                                    window_ms=max_segment_ms, duration=audio_duration,
+                                                    info=detect_info)
+            more_segments = _split_long_segments(detected, max_segment_ms)
+            # Only wait for the first two segments (enough to pick the inline
+            # or pipelined path); the rest are queued while VAD keeps running
+            speech_segments = list(islice(more_segments, 2))
             
             if speech_segments:
-                original_count = len(speech_segments)
-                speech_segments = _split_long_segments(speech_segments, max_segment_ms)
-                print(f"VAD: {original_count} speech segments → {len(speech_segments)} after splitting (max {max_segment_ms/1000:.0f}s). "
-                      f"Processing in parallel (max 5 workers, lang={source_lang or 'auto'})...")
+                if vad_mode != 'periodic':
+                    vad_info = detect_info
+                print(f"VAD: streaming speech segments (split at max {max_segment_ms/1000:.0f}s). "
+                      f"Processing in parallel (max {max_workers or DEFAULT_API_WORKERS} workers, lang={source_lang or 'auto'})...")
+            elif detect_info.get('duration'):
+                # The whole file was decoded and is silent: nothing to transcribe
+                print("No speech detected by VAD.")
+                return TranscriptResult([], no_speech=True)
             else:
                 print("No speech detected by VAD. Falling back to standard chunking.")
         
         elif use_custom_chunking:
             # No VAD, but user chose a specific chunk size → fixed-interval splitting
-            total_duration = audio_splitter.get_audio_duration(audio_file_path)
+            total_duration = audio_duration or audio_splitter.get_audio_duration(audio_file_path)
             if total_duration:
                 total_ms = int(total_duration * 1000)
                 stride_ms = max(max_segment_ms - SEGMENT_OVERLAP_MS, max_segment_ms // 2)
@@ -428,7 +655,7 @@ def transcribe_audio(client, audio_file_path, source_lang=None, use_vad=False, w
                     current += stride_ms
                 print(f"Fixed chunking: {len(speech_segments)} segments of ~{max_segment_ms/1000:.0f}s each "
                       f"({SEGMENT_OVERLAP_MS/1000:.0f}s overlap, total {total_duration:.0f}s). "
-                      f"Processing in parallel (max 5 workers, lang={source_lang or 'auto'})...")
+                      f"Processing in parallel (max {max_workers or DEFAULT_API_WORKERS} workers, lang={source_lang or 'auto'})...")
             else:
                 print("Could not determine audio duration. Falling back to standard chunking.")
         
@@ -436,107 +663,133 @@ def transcribe_audio(client, audio_file_path, source_lang=None, use_vad=False, w
             print(f"Using standard chunking. (lang={source_lang or 'auto'})")
         
         all_segments = []
+        complete = True
         
         # ===== VAD Path: process each segment individually, in parallel =====
         if speech_segments:
-            MAX_WORKERS = 5  # Handle more sub-segments efficiently
+            api_workers = max_workers or DEFAULT_API_WORKERS
+            extract_workers = os.cpu_count() or 1
+            if engine == 'google':
+                codec_attempts = GOOGLE_CODEC_ATTEMPTS
+            else:
+                # Probe once; copy the source codec when Whisper can take it as is
+                codec = audio_splitter.get_audio_codec(audio_file_path)
+                copy_format = WHISPER_COPY_FORMATS.get(codec)
+                codec_attempts = (copy_format, WHISPER_ENCODE_FORMAT) if copy_format else (WHISPER_ENCODE_FORMAT,)
+                print(f"Source codec: {codec or 'unknown'} → segments as "
+                      f"{'stream copy' if copy_format else 'MP3 re-encode'}")
             
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = {}
-                for i, (start_ms, end_ms) in enumerate(speech_segments):
-                    duration_sec = (end_ms - start_ms) / 1000.0
-                    print(f"  Queuing segment {i+1}/{len(speech_segments)}: "
-                          f"{start_ms/1000.0:.1f}s - {end_ms/1000.0:.1f}s "
-                          f"(duration: {duration_sec:.1f}s)")
-                    
-                    if engine == 'google':
-                        future = executor.submit(
-                            _transcribe_single_segment_google,
-                            google_api_key, audio_file_path, i, start_ms, end_ms, google_lang
-                        )
-                    else:
-                        future = executor.submit(
-                            _transcribe_single_segment,
-                            client, audio_file_path, i, start_ms, end_ms, source_lang, whisper_prompt
-                        )
-                    futures[future] = i
-                
-                results = {}
-                for future in as_completed(futures):
-                    seg_index, segments = future.result()
-                    results[seg_index] = segments
+            def transcribe_segment(i, start_ms, end_ms, extracted):
+                if engine == 'google':
+                    return _transcribe_single_segment_google(google_api_key, extracted, i, start_ms, end_ms, google_lang)
+                reextract = None
+                if copy_format and engine == 'whisper':
+                    # The API may still reject a stream-copied container
+                    reextract = partial(_extract_segment_to_bytes, audio_file_path, start_ms, end_ms, (WHISPER_ENCODE_FORMAT,))
+                return _transcribe_single_segment(client, extracted, i, start_ms, end_ms, source_lang, whisper_prompt, engine, reextract)
             
-            # Reassemble in original order
-            for i in range(len(speech_segments)):
-                if i in results:
-                    all_segments.extend(results[i])
+            if len(speech_segments) == 1:
+                # Nothing to overlap: run inline, without the thread pools
+                start_ms, end_ms = speech_segments[0]
+                extracted = _extract_segment_to_bytes(audio_file_path, start_ms, end_ms, codec_attempts)
+                results = dict([transcribe_segment(0, start_ms, end_ms, extracted)])
+                segment_count = 1
+            else:
+                # Two-stage pipeline: ffmpeg extraction (CPU-bound) feeds the API
+                # requests (network-bound), each stage with its own pool. The
+                # hand-off happens on this thread: finished extractions land
+                # in done_queue and are submitted as new VAD segments arrive,
+                # the rest once VAD ends.
+                with ThreadPoolExecutor(max_workers=extract_workers) as extract_pool, \
+                     ThreadPoolExecutor(max_workers=api_workers) as api_pool:
+                    extract_futures = {}
+                    done_queue = queue.Queue()
+                    futures = []
+                    
+                    def hand_off(extract_future):
+                        i, start_ms, end_ms = extract_futures.pop(extract_future)
+                        futures.append(api_pool.submit(transcribe_segment, i, start_ms, end_ms, extract_future.result()))
+                    
+                    segment_count = 0
+                    for i, (start_ms, end_ms) in enumerate(chain(speech_segments, more_segments)):
+                        duration_sec = (end_ms - start_ms) / 1000.0
+                        print(f"  Queuing segment {i+1}: "
+                              f"{start_ms/1000.0:.1f}s - {end_ms/1000.0:.1f}s "
+                              f"(duration: {duration_sec:.1f}s)")
+                        future = extract_pool.submit(_extract_segment_to_bytes, audio_file_path, start_ms, end_ms, codec_attempts)
+                        extract_futures[future] = (i, start_ms, end_ms)
+                        future.add_done_callback(done_queue.put)
+                        segment_count += 1
+                        # Only this thread takes from the queue
+                        while not done_queue.empty():
+                            hand_off(done_queue.get())
+                    
+                    while extract_futures:
+                        hand_off(done_queue.get())
+                    
+                    results = {}
+                    for future in as_completed(futures):
+                        seg_index, segments = future.result()
+                        results[seg_index] = segments
             
-            # Deduplicate overlapping regions
-            before_dedup = len(all_segments)
-            all_segments = _deduplicate_segments(all_segments)
-            if before_dedup != len(all_segments):
-                print(f"Deduplication: {before_dedup} → {len(all_segments)} segments ({before_dedup - len(all_segments)} duplicates removed)")
+            # Reassemble in original order (failed segments are None)
+            failed = sum(results.get(i) is None for i in range(segment_count))
+            if failed:
+                print(f"Warning: {failed} of {segment_count} segments failed to transcribe.")
+                complete = False
+            if vad_info is not None and 'duration' not in vad_info:
+                print("Warning: VAD stopped before the end of the audio.")
+                complete = False
+            all_segments = list(chain.from_iterable(results.get(i) or [] for i in range(segment_count)))
             
-            print(f"Total transcribed segments (before filter): {len(all_segments)}")
+            print(f"Total transcribed segments (before dedup/filter): {len(all_segments)}")
         
         # ===== Fallback Path: standard chunking (no VAD) =====
         else:
-            chunks = audio_splitter.split_audio(audio_file_path)
-            time_offset = 0.0
-            
-            for i, chunk_path in enumerate(chunks):
-                print(f"Transcribing chunk {i+1}/{len(chunks)}: {chunk_path}")
-                with open(chunk_path, "rb") as audio_file:
-                    whisper_kwargs = {
-                        'model': 'whisper-1',
-                        'file': audio_file,
-                        'response_format': 'verbose_json',
-                        'timestamp_granularities': ['segment']
-                    }
-                    if source_lang:
-                        whisper_kwargs['language'] = source_lang
-                    if whisper_prompt:
-                        whisper_kwargs['prompt'] = whisper_prompt
-                    transcript = client.audio.transcriptions.create(**whisper_kwargs)
+            # Whisper starts on the first chunk while ffmpeg is still cutting the
+            # rest; results are reassembled in chunk order below.
+            chunk_jobs = []
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                whole_file = engine in LOCAL_ENGINES
+                if whole_file:
+                    # No upload size limit locally: feed the whole file, skip
+                    # ffmpeg, and let faster-whisper batch its speech chunks
+                    chunks = [(audio_file_path, audio_duration)]
+                else:
+                    chunks = audio_splitter.iter_audio_chunks(audio_file_path, duration=audio_duration)
+                for i, (chunk_path, chunk_duration) in enumerate(chunks):
+                    print(f"Transcribing chunk {i+1}: {chunk_path}")
+                    future = executor.submit(_transcribe_file, client, chunk_path, source_lang, whisper_prompt, engine, whole_file)
+                    chunk_jobs.append((chunk_path, chunk_duration, future))
                 
-                chunk_segments = transcript.segments if hasattr(transcript, 'segments') else (
-                    transcript.get('segments', []) if isinstance(transcript, dict) else []
-                )
-
-                for segment in chunk_segments:
-                    if hasattr(segment, 'start'):
-                        s_start, s_end, s_text = segment.start, segment.end, segment.text
-                    elif isinstance(segment, dict):
-                        s_start, s_end, s_text = segment['start'], segment['end'], segment['text']
+                time_offset = 0.0
+                for chunk_path, chunk_duration, future in chunk_jobs:
+                    all_segments.extend([
+                        {'start': segment['start'] + time_offset, 'end': segment['end'] + time_offset, 'text': segment['text']}
+                        for segment in future.result()
+                    ])
+
+                    # Chunks are cut at fixed offsets, so the next one starts
+                    # where this one was meant to end (no ffprobe needed)
+                    time_offset += chunk_duration or 0.0
                     
-                    all_segments.append({
-                        'start': s_start + time_offset,
-                        'end': s_end + time_offset,
-                        'text': s_text
-                    })
+                    if chunk_path != audio_file_path:
+                        try:
+                            os.remove(chunk_path)
+                        except:
+                            pass
 
-                duration = audio_splitter.get_audio_duration(chunk_path)
-                time_offset += duration
-                
-                if chunk_path != audio_file_path:
-                    try:
-                        os.remove(chunk_path)
-                    except:
-                        pass
-
-        # Filter hallucinations
-        filtered_segments = _filter_hallucinations(all_segments)
-        if len(filtered_segments) < len(all_segments):
-            print(f"Hallucination filter: removed {len(all_segments) - len(filtered_segments)} "
-                  f"suspicious segments ({len(all_segments)} → {len(filtered_segments)}).")
+        # Deduplicate overlapping regions (only chunked segments overlap) and filter hallucinations
+        before_dedup = len(all_segments)
+        filtered_segments, deduped_count = _postprocess_segments(all_segments, deduplicate=bool(speech_segments))
+        if before_dedup != deduped_count:
+            print(f"Deduplication: {before_dedup} → {deduped_count} segments ({before_dedup - deduped_count} duplicates removed)")
+        if len(filtered_segments) < deduped_count:
+            print(f"Hallucination filter: removed {deduped_count - len(filtered_segments)} "
+                  f"suspicious segments ({deduped_count} → {len(filtered_segments)}).")
         all_segments = filtered_segments
 
-        # Return result
-        class TranscriptResult:
-            def __init__(self, segments):
-                self.segments = segments
-        
-        return TranscriptResult(all_segments)
+        return TranscriptResult(all_segments, complete=complete)
 
     except Exception as e:
         print(f"Error during transcription: {e}")
@@ -1,95 +1,238 @@
+import io
 import json
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def translate_segments(client, segments, target_lang, model="gpt-4o", batch_size=15, progress_callback=print):
+# Below this many segments the Batch API's queueing/polling overhead isn't worth it.
+BATCH_API_MIN_SEGMENTS = 60
+BATCH_API_POLL_INTERVAL_SEC = 30
+
+# Retry backoff: 0.5s doubling per attempt, capped, plus random jitter so
+# parallel workers hitting the same rate limit don't retry in lockstep.
+RETRY_BASE_DELAY_SEC = 0.5
+RETRY_MAX_DELAY_SEC = 30
+RETRY_JITTER_SEC = 0.5
+
+def translate_segments(client, segments, target_lang, model="gpt-4o", batch_size=15, progress_callback=print, max_workers=5):
     """
     Translates transcript segments using an LLM.
     Processes in batches to avoid token limits and manage context.
+    Batches are independent network calls, so up to max_workers run in parallel.
     """
     
-    all_translated_segments = []
     total_batches = (len(segments) + batch_size - 1) // batch_size
-    previous_context = [] 
     
-    progress_callback(f"Total segments: {len(segments)}. Processing in {total_batches} batches of {batch_size}...")
+    if total_batches <= 1:
+        progress_callback(f"Total segments: {len(segments)}. Processing in {total_batches} batch...")
+        # Single batch: call inline, a thread pool would only add overhead
+        return _translate_batch(client, segments, 1, total_batches, target_lang, model, [], progress_callback) if segments else []
 
-    for i in range(0, len(segments), batch_size):
-        batch_index = i // batch_size + 1
-        progress_callback(f"Translating batch {batch_index}/{total_batches}...")
+    progress_callback(f"Total segments: {len(segments)}. Processing in {total_batches} batches of {batch_size} "
+                      f"({min(max_workers, total_batches)} in parallel)...")
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for i in range(0, len(segments), batch_size):
+            batch_index = i // batch_size + 1
+            batch = segments[i : i + batch_size]
+            
+            # Context for this batch: the last 3 items before it.
+            # We use the *Original* text for context, as that's what the LLM reads to understand the flow.
+            # Taking it from the source segments (not the previous batch's output) lets batches run concurrently.
+            previous_context = [{
+                "text": s['text']
+            } for s in segments[max(0, i - 3):i]]
+            
+            future = executor.submit(_translate_batch, client, batch, batch_index, total_batches,
+                                     target_lang, model, previous_context, progress_callback)
+            futures[future] = batch_index
         
-        batch = segments[i : i + batch_size]
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    # Reassemble in original order
+    all_translated_segments = []
+    for batch_index in range(1, total_batches + 1):
+        all_translated_segments.extend(results[batch_index])
+    return all_translated_segments
+
+def _translate_batch(client, batch, batch_index, total_batches, target_lang, model, previous_context, progress_callback=print):
+    """
+    Translates one batch, with retries and a per-segment fallback for anything the LLM skipped.
+    Returns the translated segments in batch order.
+    """
+    progress_callback(f"Translating batch {batch_index}/{total_batches}...")
+    
+    # Prepare simplified batch for LLM
+    # We assign a temporary ID for the batch context
+    simplified_batch = []
+    for j, seg in enumerate(batch):
+        simplified_batch.append({
+            "id": j, # Local ID within batch
+            "start": seg['start'],
+            "end": seg['end'],
+            "text": seg['text']
+        })
         
-        # Prepare simplified batch for LLM
-        # We assign a temporary ID for the batch context
-        simplified_batch = []
-        for j, seg in enumerate(batch):
-            simplified_batch.append({
-                "id": j, # Local ID within batch
-                "start": seg['start'],
-                "end": seg['end'],
-                "text": seg['text']
-            })
-            
-        # Retry loop for reliability
-        max_retries = 3
-        attempt = 0
-        translated_map = {}
-        success = False
+    # Retry loop for reliability
+    max_retries = 3
+    attempt = 0
+    translated_map = {}
+    success = False
 
-        while attempt < max_retries:
-            try:
-                translated_batch_list = _translate_batch_wrapper(client, simplified_batch, target_lang, model, previous_context)
-                
-                # Map by ID to ensure alignment even if LLM skips/merges
-                translated_map = {item['id']: item['text'] for item in translated_batch_list if 'id' in item and 'text' in item}
-                
-                if len(translated_map) == len(batch):
-                    success = True
-                    break
-                else:
-                    progress_callback(f"  Warning: Batch {batch_index} incomplete ({len(translated_map)}/{len(batch)}). Retrying ({attempt+1}/{max_retries})...")
-                    attempt += 1
-                    time.sleep(1) # Wait a bit before retry
-            except Exception as e:
-                progress_callback(f"  Error translating batch {batch_index}: {e}. Retrying ({attempt+1}/{max_retries})...")
+    while attempt < max_retries:
+        try:
+            translated_batch_list = _translate_batch_wrapper(client, simplified_batch, target_lang, model, previous_context)
+            
+            # Map by ID to ensure alignment even if LLM skips/merges
+            translated_map = {item['id']: item['text'] for item in translated_batch_list if 'id' in item and 'text' in item}
+            
+            if len(translated_map) == len(batch):
+                success = True
+                break
+            else:
+                progress_callback(f"  Warning: Batch {batch_index} incomplete ({len(translated_map)}/{len(batch)}). Retrying ({attempt+1}/{max_retries})...")
                 attempt += 1
-                time.sleep(1)
+                if attempt < max_retries:
+                    time.sleep(_retry_delay(attempt)) # Wait a bit before retry
+        except Exception as e:
+            progress_callback(f"  Error translating batch {batch_index}: {e}. Retrying ({attempt+1}/{max_retries})...")
+            attempt += 1
+            if attempt < max_retries:
+                time.sleep(_retry_delay(attempt, e))
+
+    if not success:
+         progress_callback(f"  Failed to translate batch {batch_index} completely after retries. Attempting individual fallback for missing segments...")
 
-        if not success:
-             progress_callback(f"  Failed to translate batch {batch_index} completely after retries. Attempting individual fallback for missing segments...")
+    return _collate_batch(client, batch, translated_map, target_lang, model, progress_callback)
 
-        for j, orig_seg in enumerate(batch):
-            # j is the local ID we assigned above
-            if j in translated_map:
-                trans_text = translated_map[j]
+def _collate_batch(client, batch, translated_map, target_lang, model, progress_callback=print):
+    """
+    Builds the translated segments for a batch from {local_id: text},
+    translating any segment the LLM skipped individually.
+    """
+    translated_segments = []
+    for j, orig_seg in enumerate(batch):
+        # j is the local ID we assigned above
+        if j in translated_map:
+            trans_text = translated_map[j]
+        else:
+            # Attempt single-segment translation fallback
+            progress_callback(f"    [Fallback] Translating missing segment {j}: \"{orig_seg['text'][:50]}...\"")
+            trans_text = _translate_single_segment_fallback(client, orig_seg, target_lang, model, progress_callback)
+            if trans_text != orig_seg['text']:
+                progress_callback(f"    [Fallback] Success: \"{trans_text[:50]}...\"")
             else:
-                # Attempt single-segment translation fallback
-                progress_callback(f"    [Fallback] Translating missing segment {j}: \"{orig_seg['text'][:50]}...\"")
-                trans_text = _translate_single_segment_fallback(client, orig_seg, target_lang, model, progress_callback)
-                if trans_text != orig_seg['text']:
-                    progress_callback(f"    [Fallback] Success: \"{trans_text[:50]}...\"")
-                else:
-                    progress_callback(f"    [Fallback] Failed, kept original.")
-            
-            all_translated_segments.append({
-                "start": orig_seg['start'],
-                "end": orig_seg['end'],
-                "text": trans_text
-            })
-            
-        # Update context for next batch (last 3 items of current batch)
-        # We store the *Original* text for context, as that's what the LLM reads to understand the flow.
-        # Ideally we'd pass both original and translated, but original is most critical for sentence completion.
-        previous_context = [{
-            "text": s['text'] 
-        } for s in batch[-3:]]
+                progress_callback(f"    [Fallback] Failed, kept original.")
         
-        # Optional: Sleep briefly to be nice to rate limits if running very fast
-        # time.sleep(0.5) 
+        translated_segments.append({
+            "start": orig_seg['start'],
+            "end": orig_seg['end'],
+            "text": trans_text
+        })
+    
+    return translated_segments
 
+def translate_segments_batch_api(client, segments, target_lang, model="gpt-4o", batch_size=15, progress_callback=print, poll_interval=BATCH_API_POLL_INTERVAL_SEC):
+    """
+    Translates transcript segments through the OpenAI Batch API: all batches
+    are submitted as one JSONL job (about half the price of synchronous calls),
+    then collated by custom_id once the job finishes.
+    Small inputs go through translate_segments instead.
+    """
+    if len(segments) < BATCH_API_MIN_SEGMENTS:
+        return translate_segments(client, segments, target_lang, model, batch_size, progress_callback)
+    
+    batches = [segments[i : i + batch_size] for i in range(0, len(segments), batch_size)]
+    
+    lines = []
+    for idx, batch in enumerate(batches):
+        simplified_batch = [{"id": j, "start": seg['start'], "end": seg['end'], "text": seg['text']}
+                            for j, seg in enumerate(batch)]
+        start = idx * batch_size
+        previous_context = [{"text": s['text']} for s in segments[max(0, start - 3):start]]
+        lines.append(json.dumps({
+            "custom_id": f"batch_{idx}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": _build_batch_messages(simplified_batch, target_lang, previous_context),
+                "response_format": {"type": "json_object"}
+            }
+        }, ensure_ascii=False))
+    
+    progress_callback(f"Total segments: {len(segments)}. Submitting {len(batches)} batches of {batch_size} to the Batch API...")
+    jsonl = io.BytesIO("\n".join(lines).encode('utf-8'))
+    input_file = client.files.create(file=("translation_batch.jsonl", jsonl), purpose="batch")
+    job = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    
+    while job.status not in ('completed', 'failed', 'expired', 'cancelled'):
+        progress_callback(f"  Batch job {job.id}: {job.status}. Checking again in {poll_interval}s...")
+        time.sleep(poll_interval)
+        job = client.batches.retrieve(job.id)
+    progress_callback(f"  Batch job {job.id}: {job.status}.")
+    
+    # custom_id -> {local_id: text}
+    batch_results = {}
+    if job.output_file_id:
+        output = client.files.content(job.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                response = item.get('response') or {}
+                if response.get('status_code') != 200:
+                    continue
+                content = response['body']['choices'][0]['message']['content']
+                translated_batch_list = json.loads(content).get('segments', [])
+                batch_results[item['custom_id']] = {t['id']: t['text'] for t in translated_batch_list if 'id' in t and 'text' in t}
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                progress_callback(f"  Warning: Unreadable Batch API result: {e}")
+    
+    all_translated_segments = []
+    for idx, batch in enumerate(batches):
+        translated_map = batch_results.get(f"batch_{idx}")
+        if translated_map is None:
+            # The whole request failed: translate this batch synchronously
+            progress_callback(f"  Batch {idx+1} missing from Batch API output, translating directly...")
+            start = idx * batch_size
+            previous_context = [{"text": s['text']} for s in segments[max(0, start - 3):start]]
+            all_translated_segments.extend(_translate_batch(client, batch, idx + 1, len(batches), target_lang,
+                                                            model, previous_context, progress_callback))
+        else:
+            if len(translated_map) < len(batch):
+                progress_callback(f"  Warning: Batch {idx+1} incomplete ({len(translated_map)}/{len(batch)}). Attempting individual fallback for missing segments...")
+            all_translated_segments.extend(_collate_batch(client, batch, translated_map, target_lang, model, progress_callback))
+    
     return all_translated_segments
 
-def _translate_batch_wrapper(client, segments, target_lang, model, previous_context=None):
+def _retry_delay(attempt, error=None):
+    """
+    Seconds to wait before retry number `attempt` (1-based): exponential
+    backoff with jitter, or the server's Retry-After (e.g. on a 429) if the
+    error carries one.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is not None:
+        try:
+            retry_after = headers.get('retry-after')
+            if retry_after is not None:
+                return min(float(retry_after), RETRY_MAX_DELAY_SEC) + random.uniform(0, RETRY_JITTER_SEC)
+        except (TypeError, ValueError, AttributeError):
+            pass
+    return min(RETRY_MAX_DELAY_SEC, RETRY_BASE_DELAY_SEC * 2 ** attempt) + random.uniform(0, RETRY_JITTER_SEC)
+
+def _build_batch_messages(segments, target_lang, previous_context=None):
+    """Chat messages for translating one batch of {'id', 'start', 'end', 'text'} segments."""
     context_str = ""
     if previous_context:
         context_lines = [item['text'] for item in previous_context]
@@ -104,19 +247,23 @@ def _translate_batch_wrapper(client, segments, target_lang, model, previous_cont
     IMPORTANT: You MUST translate every single segment given to you. Do not skip any. Do not summarize.
     """
     
-    user_content = {}
+    # Plain text around a single compact JSON list, rather than a JSON
+    # document wrapping the context string and the segments
+    user_content = ""
     if context_str:
-        user_content["previous_context_for_reference_only"] = context_str
-        
-    user_content["segments_to_translate"] = segments
+        user_content = f"Previous context (for reference only, do not translate):\n{context_str}\n\n"
+    user_content += "Translate these segments (JSON):\n" + json.dumps(segments, ensure_ascii=False, separators=(',', ':'))
     
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
+def _translate_batch_wrapper(client, segments, target_lang, model, previous_context=None):
     try:
         response = client.chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": json.dumps(user_content, ensure_ascii=False)}
-            ],
+            messages=_build_batch_messages(segments, target_lang, previous_context),
             response_format={ "type": "json_object" },
             timeout=60
         )
@@ -136,8 +283,6 @@ def _translate_single_segment_fallback(client, segment, target_lang, model, prog
     max_fallback_retries = 2
     for attempt in range(max_fallback_retries):
         try:
-            time.sleep(0.5)  # Brief delay to avoid rate limits
-            
             system_prompt = f"""You are a professional subtitle translator.
 Translate the following subtitle text into {target_lang}.
 Maintain the original meaning and tone.
@@ -158,7 +303,8 @@ Output ONLY the translated text, no other commentary.
             
         except Exception as e:
             progress_callback(f"    [Fallback Error] Attempt {attempt+1}/{max_fallback_retries} failed: {e}")
-            time.sleep(1)
+            if attempt + 1 < max_fallback_retries:
+                time.sleep(_retry_delay(attempt + 1, e))
     
     progress_callback(f"    [Fallback] All attempts failed, keeping original text.")
     return segment['text'] # Ultimate fallback to original
@@ -2,23 +2,238 @@ import subprocess
 import re
 import os
 
-def detect_speech_segments(audio_path, min_silence_len=1000, silence_thresh=-40, padding=200):
+import numpy as np
+
+from . import audio_splitter, vad_kernel
+
+# PCM format decoded for the RMS detector: 16kHz mono signed 16-bit.
+SAMPLE_RATE = 16000
+# RMS frame hop (ms).
+FRAME_MS = 20
+# Frames decoded per read from ffmpeg's stdout (~20s of audio), so memory
+# stays constant regardless of file length.
+READ_FRAMES = 1000
+# Window length for method='periodic' when the caller does not give one (ms).
+PERIODIC_WINDOW_MS = 30000
+# Default detection settings: shortest silence that splits speech (ms),
+# silence level (dBFS) and padding kept around each speech segment (ms).
+MIN_SILENCE_MS = 1000
+SILENCE_THRESH = -40
+PADDING_MS = 200
+
+# silencedetect / ffmpeg banner lines parsed from stderr.
+_SILENCE_RE = re.compile(r"silence_(start|end):\s*([0-9.]+)")
+_DURATION_RE = re.compile(r"Duration:\s*(\d{2}):(\d{2}):(\d{2}\.\d+)")
+
+def detect_speech_segments(audio_path, min_silence_len=MIN_SILENCE_MS, silence_thresh=SILENCE_THRESH, padding=PADDING_MS, method='rms', window_ms=PERIODIC_WINDOW_MS, duration=None):
     """
-    Detects non-silent segments in an audio file using ffmpeg's silencedetect filter.
+    Detects non-silent segments in an audio file.
     
     Args:
         audio_path (str): Path to audio file
         min_silence_len (int): Minimum length of silence to be considered a split (ms).
-                               Converted to seconds for ffmpeg (e.g. 1000 -> 1).
         silence_thresh (int): Silence threshold in dB (e.g. -40).
         padding (int): Padding to add to speech segments in ms (to avoid clipping words).
+        method (str): 'rms' decodes PCM once and measures frame energy with NumPy;
+                      'silencedetect' uses ffmpeg's silencedetect filter;
+                      'periodic' skips detection and cuts fixed windows, for
+                      audio that is known to be mostly speech.
+        window_ms (int): Window length for 'periodic'.
+        duration (float): Audio length in seconds if already known ('periodic' only, skips ffprobe).
         
     Returns:
         list of tuples: [(start_ms, end_ms), ...]
     """
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
-        
+    
+    if method == 'periodic':
+        return list(_iter_periodic_windows(audio_path, window_ms, duration))
+    
+    info = {}
+    silences = list(_iter_silences(audio_path, min_silence_len, silence_thresh, method, info))
+    if 'duration' not in info:
+        return []  # decoding failed
+    return _speech_from_silences(silences, info['duration'], padding)
+
+def detect_speech_segments_stream(audio_path, min_silence_len=MIN_SILENCE_MS, silence_thresh=SILENCE_THRESH, padding=PADDING_MS, method='rms', window_ms=PERIODIC_WINDOW_MS, duration=None, info=None):
+    """
+    Same as detect_speech_segments, but returns a generator that yields each
+    (start_ms, end_ms) segment as soon as ffmpeg has decoded past it, so the
+    caller can start cutting audio while detection is still running.
+    info: optional dict; info['duration'] (sec) is set once the silence
+    detector has decoded the whole file, so an empty result with a
+    duration means the audio really is silent (not that decoding failed).
+    """
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+    
+    if method == 'periodic':
+        return _iter_periodic_windows(audio_path, window_ms, duration)
+    
+    # Filled in by the silence detector: 'duration' (sec) once it is known
+    if info is None:
+        info = {}
+    silences = _iter_silences(audio_path, min_silence_len, silence_thresh, method, info)
+    return _iter_speech_segments(silences, info, padding)
+
+def _iter_silences(audio_path, min_silence_len, silence_thresh, method, info):
+    """
+    Silence generator for method ('rms' or 'silencedetect').
+    """
+    if method == 'silencedetect':
+        return _iter_silences_ffmpeg(audio_path, min_silence_len, silence_thresh, info)
+    return _iter_silences_rms(audio_path, min_silence_len, silence_thresh, info)
+
+def _iter_periodic_windows(audio_path, window_ms, duration=None):
+    """
+    Yields back-to-back (start_ms, end_ms) windows covering the whole file,
+    using only its duration (no decode pass).
+    """
+    if duration is None:
+        duration = audio_splitter.get_audio_duration(audio_path)
+    if not duration:
+        return
+    duration_ms = int(duration * 1000)
+    print(f"Periodic VAD: {-(-duration_ms // window_ms)} windows of {window_ms/1000:.0f}s")
+    for start_ms in range(0, duration_ms, window_ms):
+        yield start_ms, min(start_ms + window_ms, duration_ms)
+
+def _iter_silences_rms(audio_path, min_silence_len, silence_thresh, info):
+    """
+    Finds silences by decoding 16kHz mono PCM from ffmpeg's stdout and
+    thresholding the RMS level (silence_thresh dBFS, compared as an int16
+    mean square) of FRAME_MS frames.
+    Yields (silence_start_sec, silence_end_sec) as each silence ends and sets
+    info['duration'] once decoding finishes (left unset on error).
+    """
+    print(f"Detecting speech using RMS energy: {audio_path}")
+    
+    hop = SAMPLE_RATE * FRAME_MS // 1000  # samples per frame
+    q = vad_kernel.silence_q(silence_thresh)
+    frame_sec = FRAME_MS / 1000.0
+    masks = (vad_kernel.classify_frames(pcm, hop, q) for pcm in _iter_pcm_blocks(audio_path, info))
+    for start, end in _iter_silence_runs(masks, min_silence_len):
+        yield start * frame_sec, end * frame_sec
+
+def has_any_speech(audio_path, onset_thresh=-35, offset_thresh=-40, min_speech_ms=100):
+    """
+    Cheap "is there anything to transcribe?" check run before the
+    transcription engine, so silent downloads don't produce hallucinated text.
+    
+    A speech run starts on a frame louder than onset_thresh dBFS and lasts
+    while frames stay above offset_thresh (hysteresis); the first run of at
+    least min_speech_ms stops decoding and returns True. Returns True as
+    well if the audio can't be decoded, leaving the decision to the
+    transcription step.
+    """
+    hop = SAMPLE_RATE * FRAME_MS // 1000  # samples per frame
+    # Both levels as per-frame sums of squares: no log/sqrt per frame
+    onset_energy = hop * vad_kernel.silence_q(onset_thresh)
+    offset_energy = hop * vad_kernel.silence_q(offset_thresh)
+    min_frames = max(1, -(-min_speech_ms // FRAME_MS))
+    
+    info = {}
+    run = 0
+    blocks = _iter_pcm_blocks(audio_path, info)
+    try:
+        for pcm in blocks:
+            # One energy pass serves both thresholds
+            energy = vad_kernel.frame_energy(pcm, hop)
+            below_onset = (energy < onset_energy).tolist()
+            below_offset = (energy < offset_energy).tolist()
+            for quiet, silent in zip(below_onset, below_offset):
+                if not quiet or (run and not silent):
+                    run += 1
+                    if run >= min_frames:
+                        return True
+                else:
+                    run = 0
+    finally:
+        blocks.close()  # stops ffmpeg on an early return
+    return 'duration' not in info
+
+def _iter_pcm_blocks(audio_path, info):
+    """
+    Decodes 16kHz mono int16 PCM with ffmpeg and yields it in blocks of up to
+    READ_FRAMES complete FRAME_MS frames. Sets info['duration'] once decoding
+    finishes (left unset on error).
+    """
+    hop = SAMPLE_RATE * FRAME_MS // 1000  # samples per frame
+    cmd = [
+        'ffmpeg', '-nostdin',
+        '-v', 'error',
+        '-i', audio_path,
+        '-vn', '-sn', '-dn',
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-ac', '1', '-ar', str(SAMPLE_RATE),
+        'pipe:1'
+    ]
+    
+    total_samples = 0
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=1 << 20)
+    except Exception as e:
+        print(f"Error running ffmpeg for vad: {e}")
+        return
+    
+    with proc:
+        try:
+            leftover = b''
+            read_bytes = hop * READ_FRAMES * 2
+            while True:
+                data = proc.stdout.read(read_bytes)
+                if not data:
+                    break
+                data = leftover + data
+                usable = len(data) - len(data) % (hop * 2)
+                leftover = data[usable:]
+                if usable:
+                    pcm = np.frombuffer(data[:usable], dtype=np.int16)
+                    total_samples += pcm.size
+                    yield pcm
+            total_samples += len(leftover) // 2  # partial last frame counts toward duration only
+        finally:
+            # The consumer may stop early; don't leave ffmpeg blocked on a full pipe
+            if proc.poll() is None:
+                proc.kill()
+    
+    if proc.returncode != 0:
+        print(f"Error running ffmpeg for vad: exit code {proc.returncode}")
+        return
+    info['duration'] = total_samples / SAMPLE_RATE
+
+def _iter_silence_runs(masks, min_silence_len):
+    """
+    Run-length encodes a stream of per-frame silent masks (consecutive
+    chunks of one mask) into (start_frame, end_frame) runs lasting at least
+    min_silence_len ms. A run still open at a chunk boundary carries over.
+    """
+    min_frames = max(1, -(-min_silence_len // FRAME_MS))
+    offset = 0
+    open_start = None
+    for silent in masks:
+        # +1 edges start a run, -1 edges end one
+        edges = np.diff(silent.view(np.int8), prepend=np.int8(open_start is not None))
+        starts = (np.flatnonzero(edges == 1) + offset).tolist()
+        ends = (np.flatnonzero(edges == -1) + offset).tolist()
+        if open_start is not None:
+            starts.insert(0, open_start)
+        open_start = starts.pop() if len(starts) > len(ends) else None
+        for start, end in zip(starts, ends):
+            if end - start >= min_frames:
+                yield start, end
+        offset += silent.size
+    if open_start is not None and offset - open_start >= min_frames:
+        yield open_start, offset
+
+def _iter_silences_ffmpeg(audio_path, min_silence_len, silence_thresh, info):
+    """
+    Finds silences with ffmpeg's silencedetect filter, parsing its stderr
+    line by line while it runs.
+    Yields (silence_start_sec, silence_end_sec) and sets info['duration']
+    once ffmpeg has exited cleanly (left unset on error).
+    """
     print(f"Detecting speech using ffmpeg: {audio_path}")
     
     # ffmpeg arguments
@@ -26,9 +241,15 @@ def detect_speech_segments(audio_path, min_silence_len=1000, silence_thresh=-40,
     # d: duration in seconds (min_silence_len / 1000)
     duration_sec = min_silence_len / 1000.0
     
+    # -vn/-sn/-dn: never decode video, subtitle or data streams of muxed inputs.
+    # -hide_banner/-nostats keep stderr down to the input info (Duration) and
+    # the silencedetect lines.
     cmd = [
         'ffmpeg',
+        '-hide_banner', '-nostats', '-loglevel', 'info',
         '-i', audio_path,
+        '-vn', '-sn', '-dn',
+        '-threads', '1',
         '-af', f'silencedetect=noise={silence_thresh}dB:d={duration_sec}',
         '-f', 'null',
         '-' 
@@ -36,90 +257,123 @@ def detect_speech_segments(audio_path, min_silence_len=1000, silence_thresh=-40,
     
     try:
         # stderr contains the silencedetect output
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                text=True, errors='replace', bufsize=1)
     except Exception as e:
         print(f"Error running ffmpeg for vad: {e}")
-        return []
-        
-    output = result.stderr
+        return
     
-    # Parse output
+    parsed = {}
+    with proc:
+        try:
+            yield from _iter_silencedetect(proc.stderr, parsed)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+    
+    if proc.returncode != 0:
+        print(f"Error running ffmpeg for vad: exit code {proc.returncode}")
+        return
+    if 'duration' in parsed:
+        info['duration'] = parsed['duration']
+
+def _iter_silencedetect(lines, info):
+    """
+    Parses ffmpeg silencedetect stderr output line by line.
+    Yields (silence_start_sec, silence_end_sec) and, at the end of the
+    output, sets info['duration'] if ffmpeg printed one.
+    """
     # [silencedetect @ ...] silence_start: 24.532
     # [silencedetect @ ...] silence_end: 28.102 | silence_duration: 3.57
+    silence_start = None
+    duration = None
+    for line in lines:
+        match = _SILENCE_RE.search(line)
+        if match:
+            if match.group(1) == 'start':
+                silence_start = float(match.group(2))
+            elif silence_start is not None:
+                yield silence_start, float(match.group(2))
+                silence_start = None
+        elif duration is None:
+            # ffmpeg prints "Duration: 00:00:00.00" in the input info,
+            # before any silencedetect line
+            dur_match = _DURATION_RE.search(line)
+            if dur_match:
+                h, m, s = dur_match.groups()
+                duration = float(h)*3600 + float(m)*60 + float(s)
     
-    silence_starts = []
-    silence_ends = []
-    
-    for line in output.splitlines():
-        if "silence_start:" in line:
-            match = re.search(r"silence_start:\s*([0-9\.]+)", line)
-            if match:
-                silence_starts.append(float(match.group(1)))
-        elif "silence_end:" in line:
-            match = re.search(r"silence_end:\s*([0-9\.]+)", line)
-            if match:
-                silence_ends.append(float(match.group(1)))
-                
-    # Get total duration to find the last segment
-    # ffmpeg output usually contains "Duration: 00:00:00.00"
-    duration = 0.0
-    dur_match = re.search(r"Duration:\s*(\d{2}):(\d{2}):(\d{2}\.\d+)", output)
-    if dur_match:
-        h, m, s = dur_match.groups()
-        duration = float(h)*3600 + float(m)*60 + float(s)
-        
+    if duration is None:
+        return
     # ffmpeg silencedetect might omit silence_end if silence runs to EOF
-    if len(silence_starts) > len(silence_ends):
-        silence_ends.append(duration)
+    if silence_start is not None:
+        yield silence_start, duration
+    info['duration'] = duration
+
+def _speech_from_silences(combined_silences, duration, padding):
+    """
+    Converts time-ordered (start_sec, end_sec) silences into padded speech
+    segments [(start_ms, end_ms), ...] covering the rest of the audio.
+    Segments that overlap after padding are merged.
+    """
+    return list(_iter_speech_segments(combined_silences, {'duration': duration}, padding))
+
+def _iter_speech_segments(silences, info, padding):
+    """
+    Streaming version of _speech_from_silences: consumes silences as they
+    are detected and yields each padded, merged speech segment once the next
+    one is known not to overlap it.
+    """
+    # Padding can make neighbours overlap; the latest segment is held back
+    # so it can be merged with the next one and no audio is transcribed twice
+    pending = None
+    count = 0
+    for start, end in _iter_speech_gaps(silences, info):
+        s_ms = max(0, int(start * 1000) - padding)
+        e_ms = int(end * 1000) + padding
+        if pending and s_ms <= pending[1]:
+            pending = (pending[0], max(pending[1], e_ms))
+        elif e_ms > s_ms:
+            if pending:
+                yield pending
+                count += 1
+            pending = (s_ms, e_ms)
     
-    # Construct speech segments (intervals between silences)
-    speech_segments = []
+    # Only the last segment can run past the end of the audio once padded
+    # (no duration: decoding failed and the caller knows the end is missing)
+    if pending:
+        if 'duration' in info:
+            pending = (pending[0], min(int(info['duration'] * 1000), pending[1]))
+        if pending[1] > pending[0]:
+            yield pending
+            count += 1
     
+    print(f"Found {count} speech segments.")
+
+def _iter_speech_gaps(silences, info):
+    """
+    Yields the (start_sec, end_sec) intervals between time-ordered silences.
+    info['duration'] is read only after the last silence (the detectors
+    only set it once decoding has finished cleanly); if it never arrives,
+    no tail is added.
+    """
     # Time pointers
     current_time = 0.0
+    first = True
     
-    # 3 cases for silence/speech interleaving:
-    # 1. Starts with speech (silence_start[0] > 0)
-    # 2. Starts with silence (silence_start[0] approx 0)
-    
-    # We'll iterate through silences and fill gaps.
-    # Note: mismatched len(starts) and len(ends) shouldn't happen usually, 
-    # but if silence continues until end of file, we might miss silence_end?
-    # ffmpeg documentation says silence_end is printed when silence ends OR end of stream.
-    
-    combined_silences = sorted(list(zip(silence_starts, silence_ends)), key=lambda x: x[0])
-    
-    # If file starts with silence (start ~ 0), we skip it.
-    if combined_silences and combined_silences[0][0] < 0.1:
-         current_time = combined_silences[0][1] # Start output after first silence
-         combined_silences.pop(0)
-         
-    for s_start, s_end in combined_silences:
+    for s_start, s_end in silences:
+        # If file starts with silence (start ~ 0), we skip it.
+        if first:
+            first = False
+            if s_start < 0.1:
+                current_time = s_end  # Start output after first silence
+                continue
         if s_start > current_time:
             # Found a speech segment
-            speech_segments.append((current_time, s_start))
+            yield current_time, s_start
         current_time = s_end
-        
+    
     # Check for tail speech
-    if duration > current_time:
-         speech_segments.append((current_time, duration))
-         
-    # Convert to ms and integer
-    final_segments = []
-    for start, end in speech_segments:
-        s_ms = int(start * 1000)
-        e_ms = int(end * 1000)
-        
-        # Apply padding if requested, but clamp to boundaries?
-        # Since we are just extracting, adding padding is good for VAD softness
-        # But we must be careful not to overlap? 
-        # For simplicity, let's just use exact or small padding
-        s_ms = max(0, s_ms - padding)
-        e_ms = min(int(duration*1000), e_ms + padding)
-        
-        # Ensure valid
-        if e_ms > s_ms:
-            final_segments.append((s_ms, e_ms))
-            
-    print(f"Found {len(final_segments)} speech segments.")
-    return final_segments
+    duration = info.get('duration')
+    if duration is not None and duration > current_time:
+        yield current_time, duration
@@ -0,0 +1,56 @@
+import numpy as np
+
+# Numba is optional: with it, frames are classified by a compiled loop that
+# stops adding squares as soon as a frame is known to be loud; without it,
+# a vectorized NumPy version computes the same mask.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+def silence_q(silence_thresh):
+    """
+    Mean-square int16 level equivalent to silence_thresh dBFS: a frame is
+    silent when mean(sample**2) < q.
+    """
+    return int((10 ** (silence_thresh / 20) * 32768) ** 2)
+
+def _classify_frames_loop(pcm, hop, q):
+    n_frames = pcm.shape[0] // hop
+    silent = np.empty(n_frames, dtype=np.bool_)
+    # sum(sample**2) < hop * q  <=>  mean < q; the sum only grows, so
+    # a frame is loud as soon as the running sum reaches the limit
+    limit = np.int64(hop) * np.int64(q)
+    for f in range(n_frames):
+        base = f * hop
+        total = np.int64(0)
+        is_silent = True
+        for i in range(hop):
+            x = np.int64(pcm[base + i])
+            total += x * x
+            if total >= limit:
+                is_silent = False
+                break
+        silent[f] = is_silent
+    return silent
+
+def frame_energy(pcm, hop):
+    """
+    Sum of squared int16 samples of each complete frame of `hop` samples
+    (int64, exact). Comparing it to hop * silence_q(thresh) classifies a
+    frame against any number of thresholds from a single pass.
+    """
+    n_frames = pcm.shape[0] // hop
+    frames = pcm[:n_frames * hop].reshape(n_frames, hop).astype(np.int64)
+    return np.einsum('ij,ij->i', frames, frames)
+
+def _classify_frames_numpy(pcm, hop, q):
+    return frame_energy(pcm, hop) < np.int64(hop) * q
+
+# classify_frames(pcm, hop, q) -> bool array with one entry per complete
+# frame of `hop` int16 samples in `pcm`: True where the frame's mean square
+# is below q (see silence_q).
+if njit is not None:
+    classify_frames = njit(cache=True, boundscheck=False)(_classify_frames_loop)
+else:
+    classify_frames = _classify_frames_numpy
@@ -1,16 +1,34 @@
 import argparse
+import functools
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter, itemgetter
 from openai import OpenAI
-from utils import downloader, transcriber, translator, subtitle_formatter
+from utils import cache, downloader, transcriber, translator, subtitle_formatter, vad
 
 def load_config():
     config_path = "config.json"
-    if not os.path.exists(config_path):
+    try:
+        mtime = os.stat(config_path).st_mtime_ns
+    except OSError:
         return {}
+    # The GUI calls process_video per video: only re-parse when the file changed
+    return _read_config(config_path, mtime)
+
+@functools.lru_cache(maxsize=1)
+def _read_config(config_path, mtime):
     with open(config_path, "r") as f:
         return json.load(f)
 
+@functools.lru_cache(maxsize=4)
+def get_openai_client(api_key):
+    """
+    One OpenAI client per API key, reused across process_video calls so its
+    connection pool (and the TLS sessions in it) survives between videos.
+    """
+    return OpenAI(api_key=api_key, max_retries=0)
+
 def get_config_value(config, env_keys, config_keys=None, default=None):
     """
     Resolve config from environment variables first, then config.json keys.
@@ -28,6 +46,28 @@ def get_config_value(config, env_keys, config_keys=None, default=None):
 
     return default
 
+# Extensions a previously downloaded audio file may have, in preference order.
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.wav', '.opus', '.webm')
+
+class _TitleCharFilter(dict):
+    """
+    str.translate table for file names: keeps letters, digits and spaces
+    (any script), drops everything else. Filled lazily, one entry per
+    distinct code point seen.
+    """
+    def __missing__(self, codepoint):
+        c = chr(codepoint)
+        value = c if c.isalpha() or c.isdigit() or c == ' ' else None
+        self[codepoint] = value
+        return value
+
+_TITLE_CHARS = _TitleCharFilter()
+
+def _write_file(path, render, *segment_lists):
+    data = render(*segment_lists)
+    with open(path, 'wb') as f:
+        f.write(data)
+
 def ensure_dirs(base_path):
     dirs = {
         'original': os.path.join(base_path, 'original'),
@@ -37,12 +77,30 @@ def ensure_dirs(base_path):
         os.makedirs(d, exist_ok=True)
     return dirs
 
-def process_video(url, lang=None, model=None, force_audio=False, source_lang=None, use_vad=False, whisper_prompt=None, max_segment_sec=None, engine='whisper', progress_callback=print, download_progress_callback=None):
+def process_video(url, lang=None, model=None, force_audio=False, source_lang=None, use_vad=False, whisper_prompt=None, max_segment_sec=None, engine='whisper', progress_callback=print, download_progress_callback=None, use_batch_api=False, vad_mode='rms', skip_silent=False):
     """
     Main processing logic, callable by UI.
+    use_batch_api: translate through the OpenAI Batch API (cheaper, but may take much longer).
+    vad_mode: VAD method when use_vad is set: 'rms', 'silencedetect' or
+        'periodic' (fixed windows, no detection pass; for speech-dense audio).
+    skip_silent: energy pre-check (vad.has_any_speech) that writes empty
+        subtitles without transcribing when the audio has no speech.
+        Off by default: its thresholds can miss quiet speech.
     progress_callback: function to receive log strings.
     download_progress_callback: function to receive yt-dlp percent string (e.g. "45.0%").
     """
+    # One Downloader per video: the info extracted once is reused by the
+    # subtitle/audio downloads, and its YoutubeDL is closed at the end
+    with downloader.Downloader() as dl:
+        return _process_video(
+            dl, url, lang, model, force_audio, source_lang, use_vad, whisper_prompt,
+            max_segment_sec, engine, progress_callback, download_progress_callback,
+            use_batch_api, vad_mode, skip_silent
+        )
+
+def _process_video(dl, url, lang, model, force_audio, source_lang, use_vad, whisper_prompt,
+                   max_segment_sec, engine, progress_callback, download_progress_callback,
+                   use_batch_api, vad_mode, skip_silent):
     config = load_config()
 
     api_key = get_config_value(
@@ -54,7 +112,7 @@ def process_video(url, lang=None, model=None, force_audio=False, source_lang=Non
         progress_callback("Error: Missing OpenAI API key. Set OPENAI_API_KEY or config.json openai_api_key.")
         return
 
-    client = OpenAI(api_key=api_key, max_retries=0)
+    client = get_openai_client(api_key)
     target_lang = lang if lang else get_config_value(
         config,
         env_keys=["DEFAULT_TARGET_LANGUAGE"],
@@ -68,6 +126,8 @@ def process_video(url, lang=None, model=None, force_audio=False, source_lang=Non
         default="gpt-4o"
     )
 
+    translate = translator.translate_segments_batch_api if use_batch_api else translator.translate_segments
+
     progress_callback(f"Processing URL: {url} | Target: {target_lang}")
     
     # Setup Output Directories
@@ -76,13 +136,13 @@ def process_video(url, lang=None, model=None, force_audio=False, source_lang=Non
     
     # 1. Get Video Info
     progress_callback("Fetching video info...")
-    info = downloader.get_video_info(url)
+    info = dl.info(url)
     if not info:
         progress_callback("Error: Failed to get video info.")
         return
 
     video_title = info.get('title', 'video')
-    safe_title = "".join([c for c in video_title if c.isalpha() or c.isdigit() or c==' ']).rstrip()
+    safe_title = video_title.translate(_TITLE_CHARS).rstrip()
     
     # Variables to track
     original_segments = []
@@ -91,6 +151,7 @@ def process_video(url, lang=None, model=None, force_audio=False, source_lang=Non
     # 2. Check for Manual Subtitles (unless forced audio)
     manual_subs = info.get('subtitles', {})
     found_manual_code = None
+    manual_download_failed = False
     
     if force_audio:
         progress_callback("Force Audio Source enabled: Skipping manual subtitles check.")
@@ -99,11 +160,13 @@ def process_video(url, lang=None, model=None, force_audio=False, source_lang=Non
         
         target_lang_codes = ['zh-Hans', 'zh-CN', 'zh-SG', 'zh-Hans-CN'] if 'Chinese' in target_lang else []
         
-        for code in manual_subs:
-            if code in target_lang_codes or (target_lang.lower() in code.lower()):
-                found_manual_code = code
-                progress_callback(f"Found manual subtitle for target language: {code}")
-                break
+        # Exact code lookups first (dict membership), then one substring pass
+        found_manual_code = next((code for code in target_lang_codes if code in manual_subs), None)
+        if not found_manual_code:
+            target_lang_lower = target_lang.lower()
+            found_manual_code = next((code for code in manual_subs if target_lang_lower in code.lower()), None)
+        if found_manual_code:
+            progress_callback(f"Found manual subtitle for target language: {found_manual_code}")
                 
         if not found_manual_code and manual_subs:
             progress_callback("No manual subtitle in target language found, using fallback manual subtitle.")
@@ -118,16 +181,20 @@ def process_video(url, lang=None, model=None, force_audio=False, source_lang=Non
     if found_manual_code:
         progress_callback(f"Downloading manual subtitle: {found_manual_code}")
         original_sub_path_base = os.path.join(dirs['original'], safe_title)
-        expected_filename = downloader.download_manual_subtitle(url, found_manual_code, original_sub_path_base, progress_hook=download_progress_callback)
+        expected_filename = dl.subtitle(url, found_manual_code, original_sub_path_base, progress_hook=download_progress_callback)
         
         if not expected_filename or not os.path.exists(expected_filename):
              potential = f"{original_sub_path_base}.{found_manual_code}.vtt"
              if os.path.exists(potential):
                  expected_filename = potential
              else:
-                 progress_callback(f"Error: Could not find downloaded subtitle file.")
-                 return
-                 
+                 # The audio path below can still produce subtitles
+                 progress_callback(f"Manual subtitle download failed: no subtitle file for {found_manual_code}; "
+                                   f"falling back to AI extraction...")
+                 found_manual_code = None
+                 manual_download_failed = True
+
+    if found_manual_code:
         progress_callback(f"Original subtitle saved to: {expected_filename}")
 
         # Parse original
@@ -157,86 +224,121 @@ def process_video(url, lang=None, model=None, force_audio=False, source_lang=Non
         else:
             # Fallback manual. Needs translation.
             progress_callback(f"Translating {len(original_segments)} segments to {target_lang}...")
-            translated_segments = translator.translate_segments(client, original_segments, target_lang, Model, progress_callback=progress_callback)
+            translated_segments = translate(client, original_segments, target_lang, Model, progress_callback=progress_callback)
 
     else:
         # 3. Audio Extraction & AI Flow
-        if not force_audio:
-            progress_callback("No manual subtitles found. Proceeding with AI extraction...")
-        else:
+        if force_audio:
              progress_callback("Proceeding with AI extraction (Forced)...")
+        elif not manual_download_failed:
+            progress_callback("No manual subtitles found. Proceeding with AI extraction...")
         
         audio_file_path = os.path.join(dirs['original'], f"{safe_title}_audio")
         
-        # Check if audio already exists (try common extensions)
-        audio_path = None
-        for ext in ['.mp3', '.m4a', '.wav', '.opus', '.webm']:
-            candidate = audio_file_path + ext
-            if os.path.exists(candidate) and os.path.getsize(candidate) > 0:
-                audio_path = candidate
-                break
+        # Check if audio already exists (try common extensions, in order),
+        # listing the directory once instead of probing each name
+        audio_duration = None
+        prefix = f"{safe_title}_audio"
+        existing = {}
+        with os.scandir(dirs['original']) as entries:
+            for entry in entries:
+                name, ext = os.path.splitext(entry.name)
+                if name == prefix and ext in AUDIO_EXTENSIONS and entry.is_file() and entry.stat().st_size > 0:
+                    existing[ext] = entry.path
+        audio_path = next((existing[ext] for ext in AUDIO_EXTENSIONS if ext in existing), None)
         
         if audio_path:
             progress_callback(f"Audio already exists: {os.path.basename(audio_path)}, skipping download.")
         else:
             progress_callback("Downloading audio...")
-            audio_path = downloader.download_audio(url, audio_file_path, progress_hook=download_progress_callback)
+            audio_path, audio_duration = dl.audio(url, audio_file_path, progress_hook=download_progress_callback)
             if not audio_path:
                  progress_callback("Error: Audio download failed.")
                  return
 
-        progress_callback(f"Transcribing audio ({engine})...")
-        google_api_key = get_config_value(
-            config,
-            env_keys=["GOOGLE_API_KEY"],
-            config_keys=["google_api_key", "Google API Key"]
-        )
-        if engine == 'google' and not google_api_key:
-             progress_callback("Error: Google engine requires GOOGLE_API_KEY or config.json google_api_key.")
-             return
-
-        transcript = transcriber.transcribe_audio(
-            client, audio_path, source_lang=source_lang, use_vad=use_vad, 
+        # Transcription is the expensive step; reuse a previous result for the
+        # same audio and settings (including the engine's model and defaults).
+        cache_key = cache.make_key(
+            audio_path, engine=engine, source_lang=source_lang, use_vad=use_vad,
+            vad_mode=vad_mode if use_vad else None,
             whisper_prompt=whisper_prompt, max_segment_sec=max_segment_sec,
-            engine=engine, google_api_key=google_api_key
+            **transcriber.transcription_settings(engine, use_vad, vad_mode)
         )
-        if not transcript:
-             progress_callback("Error: Transcription failed.")
-             return
-
-        original_segments_raw = transcript.segments if hasattr(transcript, 'segments') else []
-        # Standardize structure from whisper object to dict
-        for s in original_segments_raw:
-             if isinstance(s, dict):
-                 start = s['start']
-                 end = s['end']
-                 text = s['text']
-             else:
-                 start = s.start
-                 end = s.end
-                 text = s.text
-
-             original_segments.append({
-                 'start': start,
-                 'end': end,
-                 'text': text
-             })
-
-        progress_callback("Translating segments (LLM)...")
-        translated_segments = translator.translate_segments(client, original_segments, target_lang, Model, progress_callback=progress_callback)
+        cached_segments = cache.get(cache_key)
+
+        if cached_segments is not None:
+            progress_callback(f"Transcription cache hit ({len(cached_segments)} segments), skipping transcription.")
+            original_segments = cached_segments
+        # Silent or near-silent audio only makes the engine hallucinate
+        # ("Thanks for watching"), so it gets empty subtitles instead. An
+        # energy-based VAD answers this from its own decode pass (see below);
+        # otherwise an opt-in pre-check decodes until the first speech. Its
+        # verdict is not cached, so turning it off transcribes the audio.
+        elif skip_silent and (not use_vad or vad_mode == 'periodic') and not vad.has_any_speech(audio_path):
+            progress_callback("No speech detected in the audio, writing empty subtitles.")
+        else:
+            progress_callback(f"Transcribing audio ({engine})...")
+            google_api_key = get_config_value(
+                config,
+                env_keys=["GOOGLE_API_KEY"],
+                config_keys=["google_api_key", "Google API Key"]
+            )
+            if engine == 'google' and not google_api_key:
+                 progress_callback("Error: Google engine requires GOOGLE_API_KEY or config.json google_api_key.")
+                 return
+
+            transcript = transcriber.transcribe_audio(
+                client, audio_path, source_lang=source_lang, use_vad=use_vad, 
+                whisper_prompt=whisper_prompt, max_segment_sec=max_segment_sec,
+                engine=engine, google_api_key=google_api_key, audio_duration=audio_duration,
+                vad_mode=vad_mode
+            )
+            if not transcript:
+                 progress_callback("Error: Transcription failed.")
+                 return
+
+            original_segments_raw = transcript.segments if hasattr(transcript, 'segments') else []
+            # Standardize structure from whisper object to dict. An engine returns
+            # one kind of segment, so the type is checked once, not per segment.
+            if original_segments_raw:
+                fields = ('start', 'end', 'text')
+                getter = itemgetter(*fields) if isinstance(original_segments_raw[0], dict) else attrgetter(*fields)
+                original_segments = [
+                    {'start': start, 'end': end, 'text': text}
+                    for start, end, text in map(getter, original_segments_raw)
+                ]
+
+            if transcript.no_speech:
+                progress_callback("No speech detected by VAD, writing empty subtitles.")
+            # Only cache complete results; an empty one only when it means silence
+            if not transcript.complete:
+                progress_callback("Warning: part of the audio failed to transcribe, not caching this transcript.")
+            elif original_segments or transcript.no_speech:
+                cache.put(cache_key, original_segments)
+
+        if original_segments:
+            progress_callback("Translating segments (LLM)...")
+            translated_segments = translate(client, original_segments, target_lang, Model, progress_callback=progress_callback)
     
     # Generate Outputs
     progress_callback("Generating final files...")
     
-    # 1. Translated SRT
+    # Both files are rendered in memory and written with one write() each;
+    # they are independent, so one file's disk write overlaps the other's rendering
     srt_path = os.path.join(dirs['translated'], f"{safe_title}.{target_lang}.srt")
-    subtitle_formatter.generate_srt(translated_segments, srt_path)
-    progress_callback(f"Translated SRT saved: {srt_path}")
-    
-    # 2. Bilingual SRT
     bilingual_path = os.path.join(dirs['translated'], f"{safe_title}.{target_lang}.bilingual.srt")
-    subtitle_formatter.generate_bilingual_srt(original_segments, translated_segments, bilingual_path)
-    progress_callback(f"Bilingual SRT saved: {bilingual_path}")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # 1. Translated SRT
+        srt_future = executor.submit(
+            _write_file, srt_path, subtitle_formatter.render_srt_bytes, translated_segments)
+        # 2. Bilingual SRT
+        bilingual_future = executor.submit(
+            _write_file, bilingual_path, subtitle_formatter.render_bilingual_bytes, original_segments, translated_segments)
+        
+        srt_future.result()
+        progress_callback(f"Translated SRT saved: {srt_path}")
+        bilingual_future.result()
+        progress_callback(f"Bilingual SRT saved: {bilingual_path}")
     
     progress_callback("Done!")
 
@@ -248,16 +350,22 @@ def main():
     parser.add_argument("--force-audio", action="store_true", help="Force audio extraction even if manual subtitles exist")
     parser.add_argument("--source-lang", help="Source audio language ISO code (e.g. en, ja, th)", default=None)
     parser.add_argument("--use-vad", action="store_true", help="Enable Voice Activity Detection to filter silence/noise")
+    parser.add_argument("--vad-mode", choices=['rms', 'silencedetect', 'periodic'], default='rms',
+                        help="VAD method with --use-vad: 'rms' (default), 'silencedetect' (ffmpeg) or 'periodic' (fixed windows, no detection pass)")
+    parser.add_argument("--skip-silent", action="store_true",
+                        help="Write empty subtitles without transcribing when a quick energy check finds no speech")
     parser.add_argument("--whisper-prompt", help="Prompt to guide Whisper transcription", default=None)
     parser.add_argument("--max-segment-sec", type=int, help="Max segment duration in seconds (default: 600)", default=None)
-    parser.add_argument("--engine", help="Transcription engine: 'whisper' or 'google'", default='whisper')
+    parser.add_argument("--engine", help="Transcription engine: 'whisper', 'faster-whisper' (local) or 'google'", default='whisper')
+    parser.add_argument("--batch-api", action="store_true", help="Translate via the OpenAI Batch API (about half the cost, results can take up to 24h)")
     args = parser.parse_args()
     
     process_video(
         args.url, args.lang, args.model, args.force_audio, 
         source_lang=args.source_lang, use_vad=args.use_vad, 
         whisper_prompt=args.whisper_prompt, max_segment_sec=args.max_segment_sec,
-        engine=args.engine
+        engine=args.engine, use_batch_api=args.batch_api, vad_mode=args.vad_mode,
+        skip_silent=args.skip_silent
     )
 
 if __name__ == "__main__":